@@ -1,8 +1,37 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import queue
+import threading
+import time
+
 import pandas as pd
 import streamlit as st
 from langchain.agents import AgentType
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_experimental.agents import create_pandas_dataframe_agent
-from langchain_ollama import ChatOllama
+
+from modules.answer_cache import SIMILARITY_THRESHOLD, get_answer_cache
+from modules.chat_context import cached_dataset_summary, compact_history
+from modules.fingerprint import file_fingerprint
+from modules.llm_client import aclose_transports, chat_model, deadline
+from modules.llm_metrics import (format_usage, get_llm_metrics, llm_usage_panel, session_id, set_llm_scope,
+                                 usage_delta)
+from modules.sandbox import SandboxedPythonTool, get_sandbox_pool
+from modules.sql_fast_path import answer_with_sql, format_sql_answer, get_connection
+
+
+OLLAMA_MODEL = "qwen2.5:7b-instruct-q8_0"
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "https://6743-34-125-128-90.ngrok-free.app/")
+
+# The SQL fast path falls back to the agent, so give up on a slow endpoint early
+SQL_DEADLINE = 60
+
+PAGE_NAME = "Chat with Dataset"
+
+SYSTEM_PROMPT = "You are a knowledgeable assistant specialized in analyzing and answering questions about CSV files and their data. Provide clear and concise responses based on the contents of the uploaded CSV file."
+AGENT_PREFIX = "You are working with a pandas dataframe in Python. The name of the dataframe is `df`."
 
 
 # st.set_page_config(
@@ -11,15 +40,177 @@ from langchain_ollama import ChatOllama
 #     layout="centered"
 # )
 
-def show_page():
-    def read_data(file):
-        if file.name.endswith(".csv"):
-            return pd.read_csv(file,encoding='ISO-8859-1')
-        else:
-            return pd.read_excel(file)
+# Parsed once per uploaded file; cache_data hands every session its own copy, so no session sees another's edits
+@st.cache_data(max_entries=4, show_spinner=False)
+def read_data(dataset_key, _file):
+    if _file.name.endswith(".csv"):
+        return pd.read_csv(_file,encoding='ISO-8859-1')
+    else:
+        return pd.read_excel(_file)
+
+
+# One client per endpoint/model; retries, deadlines and the connection pool live in the shared transport
+@st.cache_resource
+def get_llm(model, base_url):
+    return chat_model(model, base_url, temperature=0)
+
+
+# The system prompt carries a precomputed schema/statistics summary instead of raw rows
+def build_agent(dataset_key, model, base_url, sandboxed, df):
+    pandas_df_agent = create_pandas_dataframe_agent(
+        get_llm(model, base_url),
+        df,
+        verbose=True,
+        agent_type="tool-calling",
+        allow_dangerous_code=True,
+        engine="pandas",
+        prefix=f"{AGENT_PREFIX}\n\n{cached_dataset_summary(dataset_key, df)}",
+        suffix="",
+        include_df_in_prompt=False,
+    )
+    if sandboxed:
+        # Same tool name and input schema as the built-in REPL, so the bound tools and prompt still match
+        sandbox_pool = get_sandbox_pool()
+        sandbox_pool.warm(dataset_key, df)
+        pandas_df_agent.tools = [SandboxedPythonTool(pool=sandbox_pool, dataset_key=dataset_key, df=df)]
+    return pandas_df_agent
+
+
+# The agent holds the frame and the REPL variables, so every session gets its own, reused across its turns
+def get_agent(dataset_key, model, base_url, sandboxed, df):
+    key = (dataset_key, model, base_url, sandboxed)
+    if st.session_state.get("agent_key") != key:
+        st.session_state.agent = build_agent(dataset_key, model, base_url, sandboxed, df)
+        st.session_state.agent_key = key
+    return st.session_state.agent
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+class QueueCallbackHandler(BaseCallbackHandler):
+    """Forwards LLM events from the agent thread to the Streamlit script thread."""
+
+    # Re-raise from callbacks so a cancellation aborts the running LLM stream
+    raise_error = True
+
+    def __init__(self, events, cancelled):
+        self.events = events
+        self.cancelled = cancelled
+
+    def _check_cancelled(self):
+        if self.cancelled.is_set():
+            raise GenerationCancelled()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._check_cancelled()
+        self.events.put(("llm_start", None))
 
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._check_cancelled()
+        self.events.put(("llm_start", None))
 
+    def on_llm_new_token(self, token, **kwargs):
+        self._check_cancelled()
+        self.events.put(("token", token))
+
+
+def run_agent_streaming(pandas_df_agent, messages):
+    """Run the agent on an event loop in a worker thread and render tool calls and tokens as they arrive.
+
+    Streamlit only stops a script at its next element update, so the loop
+    below keeps touching the page; when the user presses Stop the resulting
+    exception lands here and the agent task is cancelled, which closes the
+    in-flight LLM request instead of waiting for its next token.
+    """
+    events = queue.Queue()
+    cancelled = threading.Event()
+    handler = QueueCallbackHandler(events, cancelled)
+    loop = asyncio.new_event_loop()
+
+    async def consume():
+        async for chunk in pandas_df_agent.astream(messages, config={"callbacks": [handler]}):
+            for action in chunk.get("actions", []):
+                events.put(("action", action))
+            for step in chunk.get("steps", []):
+                events.put(("observation", step.observation))
+            if "output" in chunk:
+                events.put(("output", chunk["output"]))
+
+    def worker():
+        try:
+            loop.run_until_complete(loop.create_task(consume()))
+        except (GenerationCancelled, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            events.put(("error", e))
+        finally:
+            events.put(("done", None))
+            loop.run_until_complete(aclose_transports())
+            loop.close()
+
+    def cancel():
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
+
+    st.button("Stop", key="stop_generation")
+    status = st.status("Thinking...", expanded=False)
+    answer = st.empty()
+    elapsed = st.empty()
+
+    text = ""
+    output = None
+    error = None
+    finished = False
+    started = time.perf_counter()
+    # A copied context keeps the worker's LLM calls attributed to this page and session
+    threading.Thread(target=contextvars.copy_context().run, args=(worker,), daemon=True).start()
+    try:
+        while True:
+            try:
+                kind, payload = events.get(timeout=0.25)
+            except queue.Empty:
+                elapsed.caption(f"{time.perf_counter() - started:.1f}s")
+                continue
+            if kind == "llm_start":
+                text = ""
+            elif kind == "token":
+                text += payload
+                answer.markdown(text + "▌")
+            elif kind == "action":
+                tool_input = payload.tool_input
+                status.code(tool_input.get("query", tool_input) if isinstance(tool_input, dict) else tool_input,
+                            language="python")
+            elif kind == "observation":
+                status.text(str(payload)[:2000])
+            elif kind == "output":
+                output = payload
+            elif kind == "error":
+                error = payload
+            elif kind == "done":
+                finished = True
+                break
+    finally:
+        # Reached on completion, on errors and when Stop interrupts the script
+        cancelled.set()
+        with contextlib.suppress(RuntimeError):  # the loop is already closed
+            loop.call_soon_threadsafe(cancel)
+        if not finished:
+            st.session_state.chat_history.append({"role": "assistant", "content": (text + "\n\n_(cancelled)_").strip()})
+
+    if error is not None:
+        status.update(label="Failed", state="error")
+        raise error
+    status.update(label="Done", state="complete")
+    elapsed.caption(f"{time.perf_counter() - started:.1f}s")
+    answer.markdown(output)
+    return output
+
+
+def show_page():
     st.title("🤖 DataFrame ChatBot - Ollama")
+    set_llm_scope(PAGE_NAME, session_id())
 
     # initialize chat history in streamlit session state
     if "chat_history" not in st.session_state:
@@ -28,15 +219,43 @@ def show_page():
     if "df" not in st.session_state:
         st.session_state.df = None
 
+    if "dataset_key" not in st.session_state:
+        st.session_state.dataset_key = None
+
+    # rolling summary of older turns, and how many history messages it covers
+    if "chat_summary" not in st.session_state:
+        st.session_state.chat_summary = ""
+        st.session_state.chat_summarized = 0
+
 
     uploaded_file = st.file_uploader("Choose a file", type=["csv", "xlsx", "xls"])
 
     if uploaded_file:
-        st.session_state.df = read_data(uploaded_file)
+        dataset_key = file_fingerprint(uploaded_file)
+        if dataset_key != st.session_state.dataset_key or st.session_state.df is None:
+            st.session_state.df = read_data(dataset_key, uploaded_file)
+            st.session_state.dataset_key = dataset_key
         st.write("DataFrame Preview:")
         st.dataframe(st.session_state.df.head())
 
 
+    answer_mode = st.radio("Answer mode", ["Agent", "SQL fast path"], horizontal=True,
+                           help="SQL fast path asks the model for one DuckDB query and runs it locally; "
+                                "it falls back to the agent if the query fails.")
+    stream_responses = st.toggle("Stream responses", value=True)
+    sandboxed = st.toggle("Run generated code in isolated worker processes", value=True,
+                          help="Runs the agent's pandas code in a pool of worker processes with CPU, memory and time limits.")
+
+    answer_cache = get_answer_cache()
+    with st.expander("Answer cache"):
+        use_cache = st.checkbox("Reuse cached answers", value=True)
+        match_similar = st.checkbox("Also match similar questions", value=False)
+        similarity = st.slider("Similarity threshold", 0.5, 1.0, SIMILARITY_THRESHOLD, disabled=not match_similar)
+        recompute = st.checkbox("Recompute (ignore cached answers)", value=False)
+        if st.button("Clear cached answers for this dataset"):
+            answer_cache.clear(st.session_state.dataset_key)
+    show_usage = st.sidebar.checkbox("Show LLM usage", key="chat_llm_usage")
+
     # display chat history
     for message in st.session_state.chat_history:
         with st.chat_message(message["role"]):
@@ -48,28 +267,76 @@ def show_page():
     if user_prompt:
         st.chat_message("user").markdown(user_prompt)
         st.session_state.chat_history.append({"role":"user","content": user_prompt})
+        usage_before = get_llm_metrics().session_totals(session_id())
 
-        llm = ChatOllama(model="qwen2.5:7b-instruct-q8_0", temperature=0, base_url="https://6743-34-125-128-90.ngrok-free.app/")
+        cached = None
+        if use_cache and not recompute:
+            cached = answer_cache.get(st.session_state.dataset_key, user_prompt,
+                                      similarity=similarity if match_similar else None)
 
-        pandas_df_agent = create_pandas_dataframe_agent(
-            llm,
-            st.session_state.df,
-            verbose=True,
-            agent_type="tool-calling",
-            allow_dangerous_code=True,
-            engine="pandas",
-        )
+        if cached:
+            assistant_response, cached_question = cached
+            with st.chat_message("assistant"):
+                st.markdown(assistant_response)
+                st.caption(f"Cached answer for \"{cached_question}\"")
+        else:
+            assistant_response = None
+            if answer_mode == "SQL fast path":
+                # One LLM call for the query, vectorized execution in DuckDB
+                try:
+                    with st.spinner("Running SQL..."), deadline(SQL_DEADLINE):
+                        sql, result = answer_with_sql(
+                            get_llm(OLLAMA_MODEL, OLLAMA_URL),
+                            get_connection(st.session_state.dataset_key, st.session_state.df),
+                            user_prompt,
+                            conversation_summary=st.session_state.chat_summary,
+                        )
+                except Exception as e:
+                    st.caption(f"SQL fast path failed, falling back to the agent: {e}")
+                else:
+                    with st.chat_message("assistant"):
+                        st.code(sql, language="sql")
+                        st.dataframe(result, hide_index=True)
+                    assistant_response = format_sql_answer(sql, result)
 
-        messages = [
-            {"role":"system", "content": "You are a knowledgeable assistant specialized in analyzing and answering questions about CSV files and their data. Provide clear and concise responses based on the contents of the uploaded CSV file."},
-            *st.session_state.chat_history
-        ]
+            if assistant_response is None:
+                pandas_df_agent = get_agent(st.session_state.dataset_key, OLLAMA_MODEL, OLLAMA_URL, sandboxed,
+                                            st.session_state.df)
 
-        response = pandas_df_agent.invoke(messages)
+                # Older turns are folded into a summary so the prompt stays under a fixed budget
+                st.session_state.chat_summary, st.session_state.chat_summarized = compact_history(
+                    get_llm(OLLAMA_MODEL, OLLAMA_URL),
+                    st.session_state.chat_history,
+                    st.session_state.chat_summary,
+                    st.session_state.chat_summarized,
+                )
+                system_prompt = SYSTEM_PROMPT
+                if st.session_state.chat_summary:
+                    system_prompt += f"\n\nSummary of the earlier conversation:\n{st.session_state.chat_summary}"
 
-        assistant_response = response["output"]
+                messages = [
+                    {"role":"system", "content": system_prompt},
+                    *st.session_state.chat_history[st.session_state.chat_summarized:]
+                ]
+
+                if stream_responses:
+                    with st.chat_message("assistant"):
+                        assistant_response = run_agent_streaming(pandas_df_agent, messages)
+                else:
+                    response = pandas_df_agent.invoke(messages)
+
+                    assistant_response = response["output"]
+
+                    with st.chat_message("assistant"):
+                        st.markdown(assistant_response)
+
+            if use_cache:
+                answer_cache.put(st.session_state.dataset_key, user_prompt, assistant_response)
 
         st.session_state.chat_history.append({"role":"assistant", "content": assistant_response})
 
-        with st.chat_message("assistant"):
-            st.markdown(assistant_response)
+        if show_usage:
+            st.caption(format_usage(usage_delta(usage_before, get_llm_metrics().session_totals(session_id()))))
+
+    if show_usage:
+        llm_usage_panel(PAGE_NAME)
@@ -0,0 +1,129 @@
+import contextlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+import streamlit as st
+
+
+CACHE_PATH = os.path.join(".cache", "chat_answers.sqlite")
+DEFAULT_TTL = 7 * 24 * 3600
+MAX_ENTRIES = 5000
+EMBEDDING_DIM = 512
+SIMILARITY_THRESHOLD = 0.9
+
+
+def normalize_question(question):
+    """Case, whitespace and trailing punctuation do not change the question."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?!.")
+
+
+def hashed_embedding(text, dim=EMBEDDING_DIM):
+    """Local bag of words and character trigrams, hashed into a unit vector."""
+    words = re.findall(r"\w+", text)
+    features = words + [text[i:i + 3] for i in range(len(text) - 2)]
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        vector[zlib.crc32(feature.encode()) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """Persistent answers keyed by dataset fingerprint and normalized question.
+
+    Entries expire after ``ttl`` seconds and the least recently used ones are
+    evicted beyond ``max_entries``. With ``similarity`` set, a miss on the
+    exact question falls back to the closest cached question for the same
+    dataset whose embedding cosine similarity reaches the threshold.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES, embed=hashed_embedding):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed = embed
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " dataset TEXT, question TEXT, answer TEXT, embedding BLOB,"
+                " created REAL, accessed REAL, PRIMARY KEY (dataset, question))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, dataset_key, question, similarity=None):
+        """Return (answer, cached question) or None."""
+        question = normalize_question(question)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+            row = conn.execute(
+                "SELECT question, answer FROM answers WHERE dataset = ? AND question = ?",
+                (dataset_key, question),
+            ).fetchone()
+            if row is None and similarity is not None:
+                row = self._closest(conn, dataset_key, question, similarity)
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE answers SET accessed = ? WHERE dataset = ? AND question = ?",
+                (now, dataset_key, row[0]),
+            )
+        return row[1], row[0]
+
+    def _closest(self, conn, dataset_key, question, threshold):
+        rows = conn.execute(
+            "SELECT question, answer, embedding FROM answers WHERE dataset = ?", (dataset_key,)
+        ).fetchall()
+        if not rows:
+            return None
+        matrix = np.stack([np.frombuffer(embedding, dtype=np.float32) for _, _, embedding in rows])
+        scores = matrix @ self.embed(question)
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        return rows[best][0], rows[best][1]
+
+    def put(self, dataset_key, question, answer):
+        question = normalize_question(question)
+        now = time.time()
+        embedding = self.embed(question).astype(np.float32).tobytes()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                (dataset_key, question, answer, embedding, now, now),
+            )
+            conn.execute(
+                "DELETE FROM answers WHERE rowid IN ("
+                " SELECT rowid FROM answers ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, dataset_key=None):
+        with self._lock, self._connect() as conn:
+            if dataset_key is None:
+                conn.execute("DELETE FROM answers")
+            else:
+                conn.execute("DELETE FROM answers WHERE dataset = ?", (dataset_key,))
+
+
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache()
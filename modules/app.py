@@ -5,12 +5,23 @@ from streamlit_agraph import agraph, Node, Edge
 
 import requests
 import json
+import os
+from itertools import islice
 from AutoClean import AutoClean
-from langchain.schema import Document
-from langchain.document_loaders import CSVLoader 
 from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_community.llms import Ollama
-from langchain_community.graphs import Neo4jGraph
+from modules.fingerprint import file_fingerprint, state_fingerprint
+from modules.graph_cache import extraction_signature, get_graph_cache
+from modules.graph_layout import BROWSER, FORCE, LAYOUTS, compute_layout
+from modules.graph_extraction import BATCH_SIZE, EXTRACTION_WORKERS, extract_with_cache
+from modules.graph_packing import PACK_TOKEN_BUDGET, ROWS_PER_CALL
+from modules.graph_sync import GraphSync, reset_database
+from modules.graph_communities import COMMUNITY_PREFIX, community_view, graph_communities
+from modules.graph_snapshot import get_snapshot_store
+from modules.graph_view import MAX_HOPS, MAX_NODES, PAGE_SIZE, GraphView, merge_views
+from modules.graph_writer import APOC, TRANSACTION_SIZE, UNWIND, Neo4jBulkWriter
+from modules.llm_client import completion_model
+from modules.llm_metrics import format_usage, get_llm_metrics, llm_usage_panel, session_id, set_llm_scope, usage_delta
+from modules.tabular_graph import build_graph_documents, frame_documents, infer_schema
 
 class Config:
   def __init__(self, height=750, width=750, directed=True, physics=True, hierarchical=False, from_json=None, **kwargs):
@@ -32,6 +43,7 @@ class Config:
                     }
     # https://visjs.github.io/vis-network/docs/network/layout.html
     self.layout = {
+        "improvedLayout": kwargs.get("improvedLayout", True),
         "hierarchical": {
           "enabled":hierarchical,
           "levelSeparation": kwargs.get("levelSeparation", 150),
@@ -79,6 +91,7 @@ class ConfigBuilder(object):
         self.basic_widget = self.basic_widget()
         self.physics_widget = self.physics_widget()
         self.hierarchical_widget = self.hierarchical_widget()
+        self.layout_widget = self.layout_widget()
         self.groups = self.group_widget()
 
     def basic_widget(self):
@@ -194,6 +207,27 @@ class ConfigBuilder(object):
                            }
                           )
 
+    def layout_widget(self):
+        layout_expander = st.sidebar.expander("Layout Config", expanded=False)
+        # A keyed widget ignores index= after its first run, so the caller's (size-based) default
+        # goes through session state until the user picks a layout themselves
+        if not st.session_state.get("layout_engine_picked"):
+            st.session_state.layout_engine = LAYOUTS[self._get_index(LAYOUTS, "layout_engine")]
+        with layout_expander:
+            layout_expander.selectbox("layout",
+                                      options=LAYOUTS,
+                                      key="layout_engine",
+                                      on_change=self._layout_picked,
+                                      help="Server layouts send fixed positions, so the browser skips the physics simulation.")
+            self.kwargs["layout_engine"] = st.session_state.layout_engine
+            if st.session_state.layout_engine != BROWSER:
+                self.kwargs["physics"] = False
+                self.kwargs["improvedLayout"] = False
+
+    @staticmethod
+    def _layout_picked():
+        st.session_state.layout_engine_picked = True
+
     def group_widget(self):
         group_expander = st.sidebar.expander("Group Config", expanded=False)
         group_expander.checkbox("groups",
@@ -231,40 +265,100 @@ class ConfigBuilder(object):
             index = 0
         return index
 
+SCHEMA_BUILDER = "Column schema (no LLM)"
+LLM_BUILDER = "LLM extraction"
+SERVER_LAYOUT_NODES = 300
+
 driver = GraphDatabase.driver("neo4j://localhost:7687", auth=("neo4j", "password"))
 def show_page():
-    def visualize_graph():
-        nodes = []
-        edges = []
-        seen_nodes = set()
-        with driver.session() as session:
-            result = session.run("MATCH (n)-[r]->(m) RETURN n, r, m")
-            for record in result:
-                node1_id = str(record["n"].id)
-                node2_id = str(record["m"].id)
-                rel_type = record["r"].type
-
-                if node1_id not in seen_nodes:
-                    nodes.append(Node(id=node1_id, label=record["n"].get("name", node1_id)))
-                    seen_nodes.add(node1_id)
-                if node2_id not in seen_nodes:
-                    nodes.append(Node(id=node2_id, label=record["m"].get("name", node2_id)))
-                    seen_nodes.add(node2_id)
-
-                edges.append(Edge(source=node1_id, target=node2_id, label=rel_type))
+    def visualize_graph(view):
+        nodes = [Node(id=node["id"], label=node["label"], group=node["group"], title=node["title"],
+                      size=node.get("size", 10 + min(node["degree"], 40) / 2))
+                 for node in view["nodes"].values()]
+        edges = [Edge(source=edge["source"], target=edge["target"], label=edge["label"])
+                 for edge in view["edges"].values()
+                 if edge["source"] in view["nodes"] and edge["target"] in view["nodes"]]
 
         if not nodes:
             return None
 
-        config_builder = ConfigBuilder(nodes=nodes, edges=edges)
+        # Browser physics stalls on big graphs, so those start with a server-side layout
+        config_builder = ConfigBuilder(nodes=nodes, edges=edges,
+                                       layout_engine=FORCE if len(nodes) > SERVER_LAYOUT_NODES else BROWSER)
+        layout_engine = config_builder.kwargs["layout_engine"]
+        if layout_engine != BROWSER:
+            positions = compute_layout(tuple(node.id for node in nodes),
+                                       tuple((edge.source, edge.to) for edge in edges), layout_engine)
+            for node in nodes:
+                node.x, node.y = positions[node.id]
         config = config_builder.build()
 
         return agraph(nodes=nodes, edges=edges, config=config)
 
-    ollama_url = "https://1fe6-34-16-168-185.ngrok-free.app/"
-    llm = Ollama(model="llama3", base_url=ollama_url)
+    def edit_schema(df, key):
+        inferred = infer_schema(df)
+        entities = list(st.multiselect("Entity columns (the first one carries the other columns as properties)",
+                                       list(df.columns), default=inferred["entities"], key=f"entities_{key}"))
+        relationships = st.data_editor(
+            pd.DataFrame(inferred["relationships"], columns=["Source column", "Relationship", "Target column"]),
+            num_rows="dynamic",
+            column_config={
+                "Source column": st.column_config.SelectboxColumn(options=list(df.columns), required=True),
+                "Relationship": st.column_config.TextColumn(required=True),
+                "Target column": st.column_config.SelectboxColumn(options=list(df.columns), required=True),
+            },
+            key=f"relationships_{key}",
+        ).dropna()
+        relationships = [tuple(row) for row in relationships.itertuples(index=False)]
+        # Columns used in a relationship are entities even if not selected above
+        for source, _, target in relationships:
+            entities += [column for column in (source, target) if column not in entities]
+        return {
+            "entities": entities,
+            "relationships": relationships,
+            "properties": [column for column in df.columns if column not in entities],
+        }
+
+    ollama_url = os.environ.get("OLLAMA_URL", "https://1fe6-34-16-168-185.ngrok-free.app/")
+    llm = completion_model("llama3", ollama_url)
 
     st.title("RAG Graph with Neo4j, Llama3 (Ollama), and CSV Upload")
+    set_llm_scope("Knowledge graph", session_id())
+    show_usage = st.sidebar.checkbox("Show LLM usage", key="graph_llm_usage")
+    graph_builder = st.sidebar.radio("Graph builder", [SCHEMA_BUILDER, LLM_BUILDER],
+                                     help="Structured tables map columns to nodes and relationships directly; "
+                                          "the LLM extracts entities from free text in each row.")
+    workers = st.sidebar.slider("Extraction workers", 1, 16, EXTRACTION_WORKERS,
+                                help="Rows sent to the LLM concurrently.")
+    rows_per_call = st.sidebar.slider("Rows per LLM call", 1, 32, ROWS_PER_CALL,
+                                      help="Rows packed into one extraction prompt; entities are attributed back "
+                                           "to their rows. 1 sends every row on its own.")
+    batch_size = st.sidebar.number_input("Neo4j write batch size", 10, 1000, BATCH_SIZE, step=10)
+    write_method = st.sidebar.selectbox("Neo4j write method", [UNWIND, APOC],
+                                        format_func={UNWIND: "UNWIND", APOC: "apoc.periodic.iterate"}.get,
+                                        help="apoc.periodic.iterate batches on the server; UNWIND sends one "
+                                             "transaction per batch from here.")
+    transaction_size = st.sidebar.number_input("Neo4j transaction size", 100, 100_000, TRANSACTION_SIZE, step=100,
+                                               help="Nodes or relationships committed per transaction.")
+    if st.sidebar.button("Clear cached graph extractions"):
+        get_graph_cache().clear()
+        st.session_state.graph_documents = None
+    if st.sidebar.button("Delete all graphs in Neo4j", help="Removes every node and relationship, not only this file's."):
+        with st.spinner("Deleting existing graph data..."):
+            try:
+                deleted = reset_database(driver)
+                st.session_state.graph_synced_key = None
+                get_snapshot_store().invalidate()
+                st.sidebar.success(f"Deleted {deleted} nodes and their relationships.")
+            except Exception as e:
+                st.sidebar.error(f"An error occurred while deleting nodes: {e}")
+
+    use_snapshot = st.sidebar.checkbox("In-memory graph snapshot", key="graph_snapshot",
+                                       help="Load the graph into memory once and answer the visualization from it "
+                                            "instead of querying Neo4j on every interaction.")
+    if use_snapshot and st.sidebar.button("Reload graph snapshot", help="Pick up changes made outside this app."):
+        get_snapshot_store().invalidate()
+        st.session_state.graph_view = None
 
     uploaded_file = st.file_uploader("Choose a file", type=['csv'])
 
@@ -274,39 +368,82 @@ def show_page():
         with st.expander("View Uploaded Data"):
             st.dataframe(dataset)
 
-        st.subheader("Deleting existing Neo4j nodes and relationships")
-        with st.spinner("Deleting existing graph data..."):
-            query = "MATCH (n) DETACH DELETE n"
-            try:
-                with driver.session() as session:
-                    session.run(query)
-                st.success("Successfully deleted all existing nodes and relationships in Neo4j.")
-            except Exception as e:
-                st.error(f"An error occurred while deleting nodes: {e}")
+        # Re-uploading under the same name updates that graph in place; other graphs are left alone
+        graph_name = st.sidebar.text_input("Graph name", value=uploaded_file.name, key="graph_name") or uploaded_file.name
 
         st.subheader("Cleaned and converted data")
         with st.spinner("Cleaning and converting to schema..."):
             pipeline = AutoClean(dataset)
-            txt_file = "cleaned_customers.csv"
-            pipeline.output.to_csv(txt_file, sep=",", index=True, header=True)
+            cleaned = pipeline.output
 
-            loader = CSVLoader(file_path="cleaned_customers.csv")
-            docs = loader.load()
-            documents = [Document(page_content=doc.page_content) for doc in docs]
-
-            
+            # Row documents are generated on demand from the cleaned frame
             with st.expander("cleaned data"):
-                for doc in documents[:10]:
+                for doc in islice(frame_documents(cleaned), 10):
                     st.write(doc.page_content)
 
-        if 'graph_documents' not in st.session_state:
+        if graph_builder == SCHEMA_BUILDER:
+            st.subheader("Graph schema")
+            schema = edit_schema(cleaned, file_fingerprint(uploaded_file))
+            signature = state_fingerprint(graph_builder, schema)
+        else:
+            llm_transformer = LLMGraphTransformer(llm=llm)
+            signature = extraction_signature(llm_transformer, llm.model, rows_per_call, PACK_TOKEN_BUDGET)
+        # The session copy only holds documents for this file and these extraction settings
+        graph_key = state_fingerprint(file_fingerprint(uploaded_file), signature)
+        if st.session_state.get("graph_documents_key") != graph_key:
             st.session_state.graph_documents = None
+            st.session_state.graph_documents_key = graph_key
+
+        # Only what changed since the graph was last synced is written; reruns with the same input skip it
+        sync_key = (graph_key, graph_name)
+        sync = None
+        if st.session_state.get("graph_synced_key") != sync_key:
+            try:
+                writer = Neo4jBulkWriter(driver, transaction_size=transaction_size, method=write_method)
+                sync = GraphSync(driver, graph_name, writer).load()
+            except Exception as e:
+                st.error(f"An error occurred while connecting to Neo4j: {e}")
 
         st.subheader("Graph Conversion")
-        with st.spinner("Converting to graph document..."):
-            if st.session_state.graph_documents is None:
-                llm_transformer = LLMGraphTransformer(llm=llm)
-                st.session_state.graph_documents = llm_transformer.convert_to_graph_documents(documents)
+        written = 0
+        failed = 0
+        write_errors = []
+        if st.session_state.graph_documents is None and graph_builder == SCHEMA_BUILDER:
+            with st.spinner("Building graph from the schema..."):
+                graph_documents = st.session_state.graph_documents = build_graph_documents(cleaned, schema)
+        elif st.session_state.graph_documents is None:
+            # Unchanged rows come from the on-disk cache, the rest are extracted concurrently;
+            # every finished batch goes to Neo4j right away
+            usage_before = get_llm_metrics().session_totals(session_id())
+            progress = st.progress(0.0, text="Converting to graph documents...")
+            graph_documents = []
+            for batch, stats in extract_with_cache(llm_transformer, frame_documents(cleaned), get_graph_cache(),
+                                                   signature, workers=workers, batch_size=batch_size,
+                                                   rows_per_call=rows_per_call, token_budget=PACK_TOKEN_BUDGET,
+                                                   total=len(cleaned)):
+                graph_documents.extend(batch)
+                if batch and sync is not None:
+                    try:
+                        sync.upsert(batch)
+                        written += len(batch)
+                    except Exception as e:
+                        write_errors.append(str(e))
+                progress.progress(
+                    stats["done"] / max(stats["total"], 1),
+                    text=f"{stats['done']}/{stats['total']} rows converted ({stats['cached']} from cache), "
+                         f"{stats['calls']} LLM calls, {stats['docs_per_s']:.1f} rows/s, "
+                         f"{stats['failed']} failed, {written} written to Neo4j",
+                )
+            failed = stats["failed"]
+            if failed:
+                # Converted rows are in the on-disk cache, so the next run only sends the failed ones to the LLM
+                st.warning(f"{failed} rows could not be converted and will be retried on the next run, "
+                           f"e.g. {stats['errors'][0]}")
+            else:
+                st.session_state.graph_documents = graph_documents
+            if show_usage:
+                st.caption(format_usage(usage_delta(usage_before, get_llm_metrics().session_totals(session_id()))))
+        else:
             graph_documents = st.session_state.graph_documents
 
         if graph_documents:
@@ -319,22 +456,122 @@ def show_page():
                 for relation in graph_documents[0].relationships:
                     st.write(relation)
 
-        st.subheader("Adding new graph documents to Neo4j")
-        with st.spinner("Adding data to Neo4j..."):
-            try:
-                graph = Neo4jGraph(url="neo4j://localhost:7687", username="neo4j", password="password")
-                graph.add_graph_documents(
-                    graph_documents,
-                    baseEntityLabel=True,
-                    include_source=True
+        st.subheader("Syncing graph documents to Neo4j")
+        with st.spinner("Syncing data to Neo4j..."):
+            if sync is not None and not written and not write_errors:
+                # Documents converted on an earlier run (or built from the schema) are synced here
+                for start in range(0, len(graph_documents), batch_size):
+                    try:
+                        sync.upsert(graph_documents[start:start + batch_size])
+                        written += len(graph_documents[start:start + batch_size])
+                    except Exception as e:
+                        write_errors.append(str(e))
+                        break
+            if sync is not None and not write_errors:
+                if failed:
+                    # A row that failed to convert would look deleted, so keep what the graph already has
+                    st.warning(f"Kept existing nodes of graph '{graph_name}' because {failed} rows failed to convert.")
+                else:
+                    try:
+                        sync.remove_stale()
+                    except Exception as e:
+                        write_errors.append(str(e))
+                if not write_errors:
+                    if not failed:
+                        st.session_state.graph_synced_key = sync_key
+                    # The shown subgraph and the snapshot predate these writes
+                    st.session_state.graph_view = None
+                    get_snapshot_store().invalidate(graph_name)
+            if write_errors:
+                st.error(f"An error occurred while adding graph documents: {write_errors[0]}")
+            if sync is not None and not write_errors:
+                counts = sync.counts
+                st.success(
+                    f"Synced {written} graph documents to graph '{graph_name}': "
+                    f"{counts['nodes_created']} nodes created, {counts['nodes_updated']} updated, "
+                    f"{counts['nodes_unchanged']} unchanged, {counts['nodes_removed']} removed; "
+                    f"{counts['relationships_created']} relationships created, "
+                    f"{counts['relationships_removed']} removed."
                 )
-                st.success("Successfully added new graph documents to Neo4j.")
-            except Exception as e:
-                st.error(f"An error occurred while adding graph documents: {e}")
+                throughput = sync.writer.summary()
+                if throughput:
+                    st.caption(", ".join(f"{kind}: {item['rows']} written at {item['rows_per_s']} rows/s"
+                                         for kind, item in throughput.items()))
+            elif sync is None and st.session_state.get("graph_synced_key") == sync_key:
+                st.info(f"Graph '{graph_name}' is already up to date in Neo4j.")
 
         st.subheader("Graph Visualization")
-        graph_visualization = visualize_graph()
+        # Only a bounded subgraph is fetched; more is loaded on demand and merged into what is shown
+        view_mode = st.radio("Show", ["Most connected", "Around an entity", "Path between", "Random sample",
+                                      "Communities"],
+                             horizontal=True,
+                             help="Communities summarizes the whole graph; click a community to open it up.")
+        search, hops = "", 1
+        if view_mode == "Around an entity":
+            search = st.text_input("Entity", placeholder="Search node ids")
+            hops = st.slider("Hops", 1, MAX_HOPS, 1)
+        elif view_mode == "Path between":
+            source_column, target_column = st.columns(2)
+            search = (source_column.text_input("From", placeholder="Search node ids"),
+                      target_column.text_input("To", placeholder="Search node ids"))
+        page_size = st.slider("Nodes per page", 25, MAX_NODES, PAGE_SIZE, step=25)
+        view = st.session_state.get("graph_view")
+        try:
+            graph_view = get_snapshot_store().get(driver, graph_name) if use_snapshot else GraphView(driver, graph_name)
+            # Communities are detected on the whole graph, once per version of it
+            version = graph_view.version() if view_mode == "Communities" else None
+            view_key = (view_mode, search, hops, page_size, graph_name, use_snapshot, version)
+            if view_mode == "Communities":
+                if view is None or view["key"] != view_key:
+                    view = {"key": view_key, "nodes": {}, "edges": {}, "expanded": [], "clicked": None, "shown": None}
+                selected = st.session_state.get("graph_selected")
+                if selected in view["nodes"] and selected != view["clicked"] and selected.startswith(COMMUNITY_PREFIX):
+                    view["expanded"].append(int(selected[len(COMMUNITY_PREFIX):]))
+                    view["clicked"] = selected
+                if view["expanded"] and st.button("Collapse communities"):
+                    view["expanded"], view["clicked"] = [], selected
+                if view["shown"] != view["expanded"]:
+                    assignment = graph_communities(version, graph_view)
+                    view.update(community_view(graph_view, assignment, view["expanded"], page_size))
+                    view["shown"] = list(view["expanded"])
+                st.session_state.graph_view = view
+            elif view is None or view["key"] != view_key:
+                view = {"key": view_key, "nodes": {}, "edges": {}, "pages": 1, "expanded": {}}
+                if view_mode == "Most connected":
+                    merge_views(view, graph_view.top_degree(page_size))
+                elif view_mode == "Random sample":
+                    merge_views(view, graph_view.sample(page_size))
+                elif view_mode == "Path between" and all(search):
+                    merge_views(view, graph_view.path(*search))
+                elif view_mode == "Around an entity" and search:
+                    merge_views(view, graph_view.neighborhood(search, hops, page_size))
+                st.session_state.graph_view = view
+
+            load_more, expand = st.columns(2)
+            if view_mode in ("Most connected", "Random sample") and load_more.button(f"Load {page_size} more nodes"):
+                if view_mode == "Most connected":
+                    more = graph_view.top_degree(page_size, view["pages"] * page_size, known=view["nodes"])
+                else:
+                    more = graph_view.sample(page_size, known=view["nodes"])
+                view["pages"] += 1
+                if not merge_views(view, more):
+                    st.info("No more nodes to load.")
+            selected = st.session_state.get("graph_selected")
+            if view_mode != "Communities" and selected in view["nodes"] and expand.button(f"Expand {view['nodes'][selected]['label']}"):
+                offset = view["expanded"].get(selected, 0)
+                merge_views(view, graph_view.expand(selected, page_size, offset, known=view["nodes"]))
+                view["expanded"][selected] = offset + page_size
+        except Exception as e:
+            st.error(f"An error occurred while loading the graph: {e}")
+
+        st.caption(f"Showing {len(view['nodes'])} nodes and {len(view['edges'])} relationships"
+                   if view else "")
+        graph_visualization = visualize_graph(view) if view else None
         if graph_visualization:
-            st.write(graph_visualization)
-        else:
-            st.warning("No data available for visualization.")
\ No newline at end of file
+            # agraph returns the clicked node, which the expand button above acts on
+            st.session_state.graph_selected = graph_visualization
+        elif not view or not view["nodes"]:
+            st.warning("No data available for visualization.")
+
+    if show_usage:
+        llm_usage_panel("Knowledge graph")
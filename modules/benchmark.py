@@ -0,0 +1,282 @@
+"""Offline benchmarks for the Chat with Dataset and Knowledge graph pages.
+
+Runs the real page code paths against a local FakeOllama server, so the
+numbers only move when our code does:
+
+    python -m modules.benchmark --scenario all --sessions 4 --turns 5
+
+The ``neo4j`` scenario is not part of ``all``: it writes to (and then
+removes) a graph named "benchmark" in the Neo4j at ``--neo4j-url``.
+Packing recall is only meaningful against a real model:
+
+    python -m modules.benchmark --scenario packing --ollama-url http://localhost:11434 --graph-model llama3
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from langchain_experimental.graph_transformers import LLMGraphTransformer
+from neo4j import GraphDatabase
+from streamlit.logger import set_log_level
+
+from modules.chat_context import compact_history
+from modules.fake_ollama import FakeOllama
+from modules.fingerprint import frame_fingerprint
+from modules.graph_extraction import EXTRACTION_WORKERS, extract_in_batches
+from modules.graph_sync import GraphSync
+from modules.graph_writer import APOC, TRANSACTION_SIZE, UNWIND, Neo4jBulkWriter
+from modules.llm_client import chat_model, completion_model
+from modules.tabular_graph import build_graph_documents, frame_documents, infer_schema
+
+
+CHAT_MODEL = "qwen2.5:7b-instruct-q8_0"
+GRAPH_MODEL = "llama3"
+QUESTIONS = [
+    "How many rows are in the dataset?",
+    "What is the average order value?",
+    "Which city has the most customers?",
+    "Are there any missing values?",
+    "What is the maximum age?",
+]
+
+
+def sample_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    cities = np.array(["Berlin", "Paris", "Madrid", "Rome", "Vienna", "Prague"])
+    return pd.DataFrame({
+        "customer_id": np.arange(1, rows + 1),
+        "name": [f"Customer {i}" for i in range(1, rows + 1)],
+        "city": cities[rng.integers(0, len(cities), rows)],
+        "age": rng.integers(18, 80, rows),
+        "order_value": rng.gamma(2.0, 40.0, rows).round(2),
+    })
+
+
+def latency_stats(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        "p50_s": round(statistics.median(samples), 4),
+        "p95_s": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4),
+        "max_s": round(samples[-1], 4),
+    }
+
+
+def chat_session(agent, llm, turns):
+    """One user's conversation, following the Chat page's agent path. Returns per-turn latencies."""
+    from modules.Chat import SYSTEM_PROMPT
+
+    history, summary, summarized, latencies = [], "", 0, []
+    for turn in range(turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        started = time.perf_counter()
+        history.append({"role": "user", "content": question})
+        summary, summarized = compact_history(llm, history, summary, summarized)
+        system_prompt = SYSTEM_PROMPT + (f"\n\nSummary of the earlier conversation:\n{summary}" if summary else "")
+        response = agent.invoke([{"role": "system", "content": system_prompt}, *history[summarized:]])
+        history.append({"role": "assistant", "content": response["output"]})
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bench_chat(fake, sessions, turns, rows, sandboxed=False):
+    from modules.Chat import build_agent
+
+    df = sample_frame(rows)
+    # One agent per session, as in the app
+    agents = [build_agent(frame_fingerprint(df), CHAT_MODEL, fake.url, sandboxed, df.copy()) for _ in range(sessions)]
+    llm = chat_model(CHAT_MODEL, fake.url, temperature=0)
+    fake.reset_counts()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(lambda agent: chat_session(agent, llm, turns), agents))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for session in results for latency in session]
+    calls = dict(fake.calls)
+    return {
+        "scenario": "chat",
+        "sessions": sessions,
+        "turns": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_s": round(len(latencies) / elapsed, 2),
+        **latency_stats(latencies),
+        "llm_calls": calls,
+        "llm_calls_per_turn": round(sum(calls.values()) / max(len(latencies), 1), 2),
+    }
+
+
+def bench_graph(fake, rows, workers=EXTRACTION_WORKERS):
+    documents = list(frame_documents(sample_frame(rows)))
+    transformer = LLMGraphTransformer(llm=completion_model(GRAPH_MODEL, fake.url))
+    fake.reset_counts()
+
+    started = time.perf_counter()
+    graph_documents = [
+        graph_document
+        for batch, _ in extract_in_batches(transformer, documents, workers=workers)
+        for graph_document in batch
+    ]
+    elapsed = time.perf_counter() - started
+
+    calls = dict(fake.calls)
+    return {
+        "scenario": "graph",
+        "workers": workers,
+        "documents": len(documents),
+        "elapsed_s": round(elapsed, 3),
+        "documents_per_s": round(len(documents) / elapsed, 2),
+        "nodes": sum(len(doc.nodes) for doc in graph_documents),
+        "relationships": sum(len(doc.relationships) for doc in graph_documents),
+        "llm_calls": calls,
+        "llm_calls_per_document": round(sum(calls.values()) / max(len(documents), 1), 2),
+    }
+
+
+def bench_schema(rows):
+    """The no-LLM column schema builder on the same rows."""
+    df = sample_frame(rows)
+    documents = list(frame_documents(df))
+    started = time.perf_counter()
+    graph_documents = build_graph_documents(df, infer_schema(df), documents)
+    elapsed = time.perf_counter() - started
+    return {
+        "scenario": "schema",
+        "documents": len(documents),
+        "elapsed_s": round(elapsed, 3),
+        "documents_per_s": round(len(documents) / elapsed, 2),
+        "nodes": len({(node.id, node.type) for doc in graph_documents for node in doc.nodes}),
+        "relationships": sum(len(doc.relationships) for doc in graph_documents),
+        "llm_calls": 0,
+    }
+
+
+def bench_neo4j(rows, url, auth, method=UNWIND, transaction_size=TRANSACTION_SIZE):
+    """Bulk write throughput of the schema graph into a live Neo4j, then a no-op resync and the cleanup."""
+    df = sample_frame(rows)
+    graph_documents = build_graph_documents(df, infer_schema(df))
+    results = []
+    with GraphDatabase.driver(url, auth=auth) as driver:
+        for phase, documents in (("write", graph_documents), ("resync", graph_documents), ("remove", [])):
+            writer = Neo4jBulkWriter(driver, transaction_size=transaction_size, method=method)
+            sync = GraphSync(driver, "benchmark", writer).load()
+            started = time.perf_counter()
+            sync.upsert(documents)
+            sync.remove_stale()
+            elapsed = time.perf_counter() - started
+            results.append({
+                "scenario": "neo4j",
+                "phase": phase,
+                "method": method,
+                "transaction_size": transaction_size,
+                "documents": len(documents),
+                "elapsed_s": round(elapsed, 3),
+                "rows_per_s": round(writer.rows_per_second(), 1),
+                "written": writer.summary(),
+                "counts": dict(sync.counts),
+            })
+    return results
+
+
+def _triples(graph_document):
+    return {(rel.source.id, rel.type, rel.target.id) for rel in graph_document.relationships}
+
+
+def bench_packing(base_url, rows, pack_sizes, workers=EXTRACTION_WORKERS, model=GRAPH_MODEL):
+    """Calls, latency and per-row recall of packed extraction against one row per call.
+
+    Recall compares each row's triples with what the same model extracted
+    from the row on its own. Against FakeOllama it is 1.0 by construction
+    (the fake answers every row alike, packed or not); pass a real
+    endpoint to measure what packing actually costs in quality.
+    """
+    documents = list(frame_documents(sample_frame(rows)))
+    # Temperature 0 so differences come from packing rather than sampling
+    transformer = LLMGraphTransformer(llm=completion_model(model, base_url, temperature=0))
+    baseline = None
+    results = []
+    for rows_per_call in sorted({1, *pack_sizes}):
+        started = time.perf_counter()
+        by_row = {}
+        for batch, stats in extract_in_batches(transformer, documents, workers=workers, rows_per_call=rows_per_call):
+            by_row.update((id(graph_document.source), _triples(graph_document)) for graph_document in batch)
+        elapsed = time.perf_counter() - started
+        extracted = [by_row.get(id(document), set()) for document in documents]
+        if baseline is None:
+            baseline = extracted
+        expected = sum(len(row) for row in baseline)
+        recovered = sum(len(row & truth) for row, truth in zip(extracted, baseline))
+        misattributed = sum(len(row - truth) for row, truth in zip(extracted, baseline))
+        results.append({
+            "scenario": "packing",
+            "model": model,
+            "rows_per_call": rows_per_call,
+            "documents": len(documents),
+            "llm_calls": stats["calls"],
+            "failed": stats["failed"],
+            "elapsed_s": round(elapsed, 3),
+            "documents_per_s": round(len(documents) / elapsed, 2),
+            "recall": round(recovered / expected, 4) if expected else None,
+            "misattributed": misattributed,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM pages against a local fake Ollama server.")
+    parser.add_argument("--scenario", choices=["chat", "graph", "packing", "schema", "neo4j", "all"], default="all")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=5, help="turns per chat session")
+    parser.add_argument("--rows", type=int, default=50, help="dataset rows (graph documents)")
+    parser.add_argument("--workers", type=int, default=EXTRACTION_WORKERS, help="concurrent graph extraction workers")
+    parser.add_argument("--pack-sizes", default="1,4,8,16", help="rows per extraction call to compare")
+    parser.add_argument("--ollama-url", help="run the packing scenario against this Ollama instead of the fake")
+    parser.add_argument("--graph-model", default=GRAPH_MODEL, help="model for the packing scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake time to first token, seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake generation speed")
+    parser.add_argument("--sandboxed", action="store_true", help="run agent code in the sandbox pool")
+    parser.add_argument("--neo4j-url", default="neo4j://localhost:7687")
+    parser.add_argument("--neo4j-auth", default="neo4j:password", help="user:password")
+    parser.add_argument("--write-method", choices=[UNWIND, APOC], default=UNWIND)
+    parser.add_argument("--transaction-size", type=int, default=TRANSACTION_SIZE)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # Page modules use st.cache_*; outside `streamlit run` that only logs warnings
+    set_log_level("error")
+
+    results = []
+    # The agent is verbose; keep stdout for the results
+    with FakeOllama(latency=args.latency, tokens_per_second=args.tokens_per_second) as fake, \
+            contextlib.redirect_stdout(io.StringIO()):
+        if args.scenario in ("chat", "all"):
+            results.append(bench_chat(fake, args.sessions, args.turns, args.rows, args.sandboxed))
+        if args.scenario in ("graph", "all"):
+            results.append(bench_graph(fake, args.rows, args.workers))
+        if args.scenario in ("schema", "all"):
+            results.append(bench_schema(args.rows))
+        if args.scenario in ("packing", "all"):
+            pack_sizes = [int(size) for size in args.pack_sizes.split(",")]
+            results.extend(bench_packing(args.ollama_url or fake.url, args.rows, pack_sizes, args.workers,
+                                         args.graph_model))
+        if args.scenario == "neo4j":
+            results.extend(bench_neo4j(args.rows, args.neo4j_url, tuple(args.neo4j_auth.split(":", 1)),
+                                       args.write_method, args.transaction_size))
+
+    for result in results:
+        print(json.dumps(result))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
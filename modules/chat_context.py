@@ -0,0 +1,69 @@
+import streamlit as st
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+
+
+HISTORY_TOKEN_BUDGET = 1500
+KEEP_RECENT_MESSAGES = 4
+
+SUMMARY_PROMPT = """Summarize the conversation below between a user and a data analysis assistant.
+Keep every fact, number, column name and conclusion that later questions may refer to.
+Reply with the summary only, in at most 200 words.
+
+Previous summary:
+{summary}
+
+New messages:
+{messages}"""
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def dataset_summary(df, max_columns=80, max_categories=5):
+    """Schema and statistics of a frame, compact enough to send on every prompt."""
+    lines = [f"The dataframe `df` has {len(df)} rows and {len(df.columns)} columns."]
+    lines.append("Columns (name: dtype, nulls, summary):")
+    for column in df.columns[:max_columns]:
+        series = df[column]
+        nulls = int(series.isna().sum())
+        if is_numeric_dtype(series) and not is_bool_dtype(series):
+            detail = f"min={series.min():.4g}, max={series.max():.4g}, mean={series.mean():.4g}" if series.notna().any() else "all null"
+        elif is_datetime64_any_dtype(series):
+            detail = f"from {series.min()} to {series.max()}"
+        else:
+            counts = series.value_counts()
+            top = ", ".join(f"{value!r} ({count})" for value, count in counts.head(max_categories).items())
+            detail = f"{len(counts)} distinct; top: {top}"
+        lines.append(f"- {column}: {series.dtype}, {nulls} nulls, {detail}")
+    if len(df.columns) > max_columns:
+        lines.append(f"... and {len(df.columns) - max_columns} more columns (use df.columns to list them).")
+    return "\n".join(lines)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def cached_dataset_summary(dataset_key, _df):
+    return dataset_summary(_df)
+
+
+def format_messages(messages):
+    return "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+
+
+def compact_history(llm, history, summary, summarized, budget=HISTORY_TOKEN_BUDGET, keep_recent=KEEP_RECENT_MESSAGES):
+    """Fold older turns into a rolling summary once the live history exceeds the budget.
+
+    ``summarized`` is how many leading messages of ``history`` are already
+    covered by ``summary``. Returns the updated (summary, summarized) pair;
+    the most recent ``keep_recent`` messages are always sent verbatim.
+    """
+    live = history[summarized:]
+    if estimate_tokens(format_messages(live)) <= budget or len(live) <= keep_recent:
+        return summary, summarized
+
+    to_fold = live[:-keep_recent]
+    prompt = SUMMARY_PROMPT.format(summary=summary or "(none)", messages=format_messages(to_fold))
+    response = llm.invoke(prompt)
+    summary = getattr(response, "content", response).strip()
+    return summary, summarized + len(to_fold)
@@ -2,6 +2,8 @@ import json
 import os
 import streamlit as st
 
+from modules.graph_layout import BROWSER, LAYOUTS
+
 
 
 class Config:
@@ -24,6 +26,7 @@ class Config:
                     }
     # https://visjs.github.io/vis-network/docs/network/layout.html
     self.layout = {
+        "improvedLayout": kwargs.get("improvedLayout", True),
         "hierarchical": {
           "enabled":hierarchical,
           "levelSeparation": kwargs.get("levelSeparation", 150),
@@ -71,6 +74,7 @@ class ConfigBuilder(object):
         self.basic_widget = self.basic_widget()
         self.physics_widget = self.physics_widget()
         self.hierarchical_widget = self.hierarchical_widget()
+        self.layout_widget = self.layout_widget()
         self.groups = self.group_widget()
 
     def basic_widget(self):
@@ -186,6 +190,27 @@ class ConfigBuilder(object):
                            }
                           )
 
+    def layout_widget(self):
+        layout_expander = st.sidebar.expander("Layout Config", expanded=False)
+        # A keyed widget ignores index= after its first run, so the caller's (size-based) default
+        # goes through session state until the user picks a layout themselves
+        if not st.session_state.get("layout_engine_picked"):
+            st.session_state.layout_engine = LAYOUTS[self._get_index(LAYOUTS, "layout_engine")]
+        with layout_expander:
+            layout_expander.selectbox("layout",
+                                      options=LAYOUTS,
+                                      key="layout_engine",
+                                      on_change=self._layout_picked,
+                                      help="Server layouts send fixed positions, so the browser skips the physics simulation.")
+            self.kwargs["layout_engine"] = st.session_state.layout_engine
+            if st.session_state.layout_engine != BROWSER:
+                self.kwargs["physics"] = False
+                self.kwargs["improvedLayout"] = False
+
+    @staticmethod
+    def _layout_picked():
+        st.session_state.layout_engine_picked = True
+
     def group_widget(self):
         group_expander = st.sidebar.expander("Group Config", expanded=False)
         group_expander.checkbox("groups",
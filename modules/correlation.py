@@ -0,0 +1,102 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+
+BLOCK_SIZE = 256
+
+
+def _block_correlation(xi, mi, xj, mj):
+    # Pairwise-complete sums for one block pair: every statistic only counts
+    # rows where both columns are present, like DataFrame.corr().
+    n = mi.T @ mj
+    sx = xi.T @ mj
+    sy = mi.T @ xj
+    sxx = (xi * xi).T @ mj
+    syy = mi.T @ (xj * xj)
+    sxy = xi.T @ xj
+
+    n, sx, sy, sxx, syy, sxy = (a.astype(np.float64) for a in (n, sx, sy, sxx, syy, sxy))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def correlation_matrix(df, block_size=BLOCK_SIZE):
+    """Pearson correlation of all numeric columns using blocked float32 matmuls."""
+    numeric = df.select_dtypes(["number"])
+    columns = numeric.columns
+    values = np.empty((len(numeric), len(columns)), dtype=np.float32)
+    present = np.empty(values.shape, dtype=bool)
+
+    # Center on the column mean in float64 before the cast, a block of columns at a time: large
+    # magnitudes (epoch seconds, offsets) would otherwise lose their variance to float32 rounding.
+    for start in range(0, len(columns), block_size):
+        block = numeric.iloc[:, start:start + block_size].to_numpy(dtype=np.float64, na_value=np.nan)
+        block_present = ~np.isnan(block)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            means = np.nanmean(block, axis=0) if len(block) else np.zeros(block.shape[1])
+        values[:, start:start + block_size] = np.where(block_present, block - np.nan_to_num(means), 0)
+        present[:, start:start + block_size] = block_present
+    centered = values
+
+    if present.all() and len(values) > 1:
+        # No nulls: a single standardized product is exact and much cheaper.
+        std = centered.std(axis=0, ddof=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = centered / std
+        corr = np.empty((len(columns), len(columns)), dtype=np.float64)
+        for start in range(0, len(columns), block_size):
+            stop = start + block_size
+            corr[start:stop] = (z[:, start:stop].T @ z) / (len(values) - 1)
+        corr[:, std == 0] = np.nan
+        corr[std == 0, :] = np.nan
+        corr = np.clip(corr, -1.0, 1.0)
+    else:
+        mask = present.astype(np.float32)
+        corr = np.empty((len(columns), len(columns)), dtype=np.float64)
+        for i in range(0, len(columns), block_size):
+            bi = slice(i, i + block_size)
+            for j in range(i, len(columns), block_size):
+                bj = slice(j, j + block_size)
+                block = _block_correlation(centered[:, bi], mask[:, bi], centered[:, bj], mask[:, bj])
+                corr[bi, bj] = block
+                corr[bj, bi] = block.T
+
+    diagonal = np.diag_indices_from(corr)
+    corr[diagonal] = np.where(np.isnan(corr[diagonal]), np.nan, 1.0)
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+def top_correlations(corr, k=20):
+    """The k column pairs with the largest absolute correlation."""
+    upper = np.triu_indices(len(corr.columns), k=1)
+    values = corr.to_numpy()[upper]
+    valid = ~np.isnan(values)
+    rows, cols, values = upper[0][valid], upper[1][valid], values[valid]
+
+    k = min(k, len(values))
+    if k == 0:
+        return pd.DataFrame(columns=["Column A", "Column B", "Correlation"])
+    best = np.argpartition(-np.abs(values), k - 1)[:k]
+    best = best[np.argsort(-np.abs(values[best]))]
+    return pd.DataFrame({
+        "Column A": corr.columns[rows[best]],
+        "Column B": corr.columns[cols[best]],
+        "Correlation": values[best],
+    })
+
+
+@st.cache_data(max_entries=8, show_spinner="Computing correlations...")
+def cached_correlation_matrix(fingerprint, _load_df):
+    # Keyed on the fingerprint only; hashing the frame itself would cost as
+    # much as the correlation we are trying to avoid. The frame is only
+    # materialized (by calling ``_load_df``) on a cache miss.
+    return correlation_matrix(_load_df())
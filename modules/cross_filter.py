@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.fingerprint import state_fingerprint
+
+
+class CrossFilter:
+    """Linked selections between dashboard charts.
+
+    A selection in one chart is stored as a (column, kind, payload) filter and
+    resolved to a packed row bitmap through the dataset's FilterIndex. Every
+    other chart is drawn from the AND of all selections except its own, and
+    aggregated charts are built with a bincount over precomputed category
+    codes instead of a groupby over the raw frame.
+    """
+
+    STATE_KEY = "cross_filter"
+
+    def __init__(self, filter_index, dataset_key):
+        self.index = filter_index
+        self.df = filter_index.df
+        self.dataset_key = dataset_key
+
+        state = st.session_state.get(self.STATE_KEY)
+        if state is None or state["dataset_key"] != dataset_key:
+            # Selections (row positions in particular) only make sense for the frame they were made on
+            if state is not None:
+                self._reset_widgets(state)
+            state = st.session_state[self.STATE_KEY] = {"dataset_key": dataset_key, "selections": {}, "widgets": {}}
+        self._state = state
+
+    @property
+    def selections(self):
+        return self._state["selections"]
+
+    def _filters(self, exclude=None):
+        return tuple(selection for chart, selection in sorted(self.selections.items()) if chart != exclude)
+
+    def view_key(self, chart):
+        """Cache key for what ``chart`` shows: the dataset plus the other charts' selections."""
+        filters = self._filters(exclude=chart)
+        return state_fingerprint(self.dataset_key, filters) if filters else self.dataset_key
+
+    def mask(self, exclude=None):
+        return self.index.mask(self._filters(exclude=exclude))
+
+    def view(self, chart):
+        """Row-level frame for ``chart``, with every other chart's selection applied."""
+        filters = self._filters(exclude=chart)
+        if not filters:
+            return self.df
+        return self.df.iloc[np.flatnonzero(self.index.mask(filters))]
+
+    @staticmethod
+    def value_name(dimension, measure=None):
+        """Column ``aggregate`` puts the totals in; never the same as ``dimension``."""
+        name = "count" if measure is None else f"{measure}_sum"
+        return name if name != dimension else f"{name}_total"
+
+    def aggregate(self, chart, dimension, measure=None):
+        """Per-category sum of ``measure`` (or row count) under the chart's view mask.
+
+        Returns the ``dimension`` column and the totals in ``value_name(dimension, measure)``.
+        """
+        uniques, codes = self.index.codes(dimension)
+        keep = codes >= 0
+        if self._filters(exclude=chart):
+            keep &= self.mask(exclude=chart)
+        weights = None
+        if measure is not None:
+            weights = np.nan_to_num(self.index.values(measure)[keep])
+        totals = np.bincount(codes[keep], weights=weights, minlength=len(uniques))
+        counts = totals if measure is None else np.bincount(codes[keep], minlength=len(uniques))
+        aggregated = pd.DataFrame({dimension: uniques, self.value_name(dimension, measure): totals})
+        return aggregated[counts > 0]
+
+    def select_values(self, chart, widget_key, column, values):
+        self._select(chart, widget_key, (column, "in", tuple(values)) if values else None)
+
+    def select_points(self, chart, widget_key, point_indices):
+        if not point_indices:
+            self._select(chart, widget_key, None)
+            return
+        # Point indices are positions in the chart's own view; map them back to frame rows
+        positions = np.flatnonzero(self.mask(exclude=chart))
+        point_indices = [index for index in point_indices if index < len(positions)]
+        rows = tuple(sorted(int(row) for row in positions[point_indices]))
+        self._select(chart, widget_key, (None, "rows", rows) if rows else None)
+
+    def _select(self, chart, widget_key, selection):
+        self._state["widgets"][chart] = widget_key
+        if self.selections.get(chart) == selection:
+            return
+        if selection is None:
+            del self.selections[chart]
+        else:
+            self.selections[chart] = selection
+        # Every other chart depends on this selection, so rerun the whole page, not just this fragment
+        st.rerun()
+
+    @staticmethod
+    def _reset_widgets(state):
+        for widget_key in state["widgets"].values():
+            st.session_state.pop(widget_key, None)
+
+    def clear(self):
+        self._reset_widgets(self._state)
+        self.selections.clear()
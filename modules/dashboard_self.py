@@ -2,48 +2,219 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
+from modules.correlation import cached_correlation_matrix, top_correlations
+from modules.cross_filter import CrossFilter
+from modules.figure_cache import get_figure_cache
+from modules.filter_index import get_filter_index
+from modules.fingerprint import file_fingerprint, state_fingerprint
+
+
+# Caching the data loading to optimize performance. cache_resource hands back
+# the same frame on every rerun instead of unpickling a copy.
+@st.cache_resource(max_entries=4)
+def load_data(dataset_key, _file):
+    return pd.read_csv(_file, encoding='ISO-8859-1')
+
+
+# The filtered frame is shared by every chart, so it is built once per filter state
+@st.cache_resource(max_entries=16)
+def filter_data(dataset_key, _filter_index, filters):
+    return _filter_index.filter(filters)
+
+
+# Each chart is a fragment: changing one of its own widgets only reruns that chart.
+# Charts read their data through the cross-filter so selections in one chart
+# filter all the others.
+@st.fragment
+def bar_plot(cross_filter, bar_color):
+    st.subheader("Interactive Bar Plot")
+    df = cross_filter.df
+    x_axis = st.selectbox('Select X-axis:', df.columns)
+    y_axis = st.selectbox('Select Y-axis:', df.select_dtypes(['number']).columns)
+    y_total = CrossFilter.value_name(x_axis, y_axis)
+    fig = get_figure_cache().get_or_build(
+        (cross_filter.view_key("bar"), "bar", x_axis, y_axis, bar_color),
+        lambda: px.bar(cross_filter.aggregate("bar", x_axis, y_axis), x=x_axis, y=y_total, title="Bar Plot",
+                       labels={y_total: y_axis}, color_discrete_sequence=[bar_color]))
+    event = st.plotly_chart(fig, key="bar_plot_chart", on_select="rerun", selection_mode=("points", "box"))
+    cross_filter.select_values("bar", "bar_plot_chart", x_axis, [point["x"] for point in event.selection.points])
+
+
+@st.fragment
+def pie_chart(cross_filter, pie_color):
+    st.subheader("Interactive Pie Chart")
+    category_column = st.selectbox('Select Categorical Column for Pie Chart',
+                                   cross_filter.df.select_dtypes(['object']).columns)
+    fig = get_figure_cache().get_or_build(
+        (cross_filter.view_key("pie"), "pie", category_column, pie_color),
+        lambda: px.pie(cross_filter.aggregate("pie", category_column), names=category_column,
+                       values=CrossFilter.value_name(category_column), title="Pie Chart",
+                       color_discrete_sequence=[pie_color]))
+    st.plotly_chart(fig)
+
+
+@st.fragment
+def time_series_plot(cross_filter, line_color):
+    st.subheader("Interactive Time Series Plot")
+    df = cross_filter.df
+    date_column = st.selectbox("Select Date Column", df.select_dtypes(['object', 'datetime']).columns)
+    value_column = st.selectbox("Select Value Column", df.select_dtypes(['number']).columns)
+    fig = get_figure_cache().get_or_build(
+        (cross_filter.view_key("line"), "line", date_column, value_column, line_color),
+        lambda: px.line(cross_filter.view("line"), x=date_column, y=value_column, title="Time Series Plot",
+                        line_shape='linear', color_discrete_sequence=[line_color]))
+    event = st.plotly_chart(fig, key="time_series_chart", on_select="rerun", selection_mode=("points", "box"))
+    cross_filter.select_values("line", "time_series_chart", date_column,
+                               [point["x"] for point in event.selection.points])
+
+
+@st.fragment
+def scatter_plot(cross_filter, scatter_color):
+    st.subheader("Interactive Scatter Plot")
+    numeric_columns = cross_filter.df.select_dtypes(['number']).columns
+    x_axis = st.selectbox('Select X-axis for Scatter Plot:', numeric_columns)
+    y_axis = st.selectbox('Select Y-axis for Scatter Plot:', numeric_columns)
+    fig = get_figure_cache().get_or_build(
+        (cross_filter.view_key("scatter"), "scatter", x_axis, y_axis, scatter_color),
+        lambda: px.scatter(cross_filter.view("scatter"), x=x_axis, y=y_axis, title="Scatter Plot",
+                           color_discrete_sequence=[scatter_color]))
+    event = st.plotly_chart(fig, key="scatter_plot_chart", on_select="rerun",
+                            selection_mode=("points", "box", "lasso"))
+    cross_filter.select_points("scatter", "scatter_plot_chart", event.selection.point_indices)
+
+
+@st.fragment
+def histogram(cross_filter, histogram_color):
+    st.subheader("Interactive Histogram")
+    hist_column = st.selectbox("Select Column for Histogram", cross_filter.df.select_dtypes(['number']).columns)
+    fig = get_figure_cache().get_or_build(
+        (cross_filter.view_key("histogram"), "histogram", hist_column, histogram_color),
+        lambda: px.histogram(cross_filter.view("histogram"), x=hist_column, title="Histogram",
+                             color_discrete_sequence=[histogram_color]))
+    st.plotly_chart(fig)
+
+
+@st.fragment
+def box_plot(cross_filter, box_color):
+    st.subheader("Interactive Box Plot")
+    y_axis = st.selectbox("Select Y-axis for Box Plot", cross_filter.df.select_dtypes(['number']).columns)
+    fig = get_figure_cache().get_or_build(
+        (cross_filter.view_key("box"), "box", y_axis, box_color),
+        lambda: px.box(cross_filter.view("box"), y=y_axis, title="Box Plot", color_discrete_sequence=[box_color]))
+    st.plotly_chart(fig)
+
+
+@st.fragment
+def bubble_chart(cross_filter, bubble_color):
+    st.subheader("Interactive Bubble Chart")
+    numeric_columns = cross_filter.df.select_dtypes(['number']).columns
+    x_axis = st.selectbox("Select X-axis for Bubble Chart", numeric_columns)
+    y_axis = st.selectbox("Select Y-axis for Bubble Chart", numeric_columns)
+    size_column = st.selectbox("Select Size Column for Bubble Chart", numeric_columns)
+    fig = get_figure_cache().get_or_build(
+        (cross_filter.view_key("bubble"), "bubble", x_axis, y_axis, size_column, bubble_color),
+        lambda: px.scatter(cross_filter.view("bubble"), x=x_axis, y=y_axis, size=size_column, title="Bubble Chart",
+                           color_discrete_sequence=[bubble_color]))
+    event = st.plotly_chart(fig, key="bubble_chart_chart", on_select="rerun",
+                            selection_mode=("points", "box", "lasso"))
+    cross_filter.select_points("bubble", "bubble_chart_chart", event.selection.point_indices)
+
+
+@st.fragment
+def treemap(cross_filter, treemap_color):
+    st.subheader("Interactive Treemap")
+    df = cross_filter.df
+    category_column = st.selectbox("Select Category for Treemap", df.select_dtypes(['object']).columns)
+    value_column = st.selectbox("Select Value for Treemap", df.select_dtypes(['number']).columns)
+    fig = get_figure_cache().get_or_build(
+        (cross_filter.view_key("treemap"), "treemap", category_column, value_column, treemap_color),
+        lambda: px.treemap(cross_filter.aggregate("treemap", category_column, value_column), path=[category_column],
+                           values=CrossFilter.value_name(category_column, value_column), title="Treemap",
+                           color_discrete_sequence=[treemap_color]))
+    st.plotly_chart(fig)
+
+
+@st.fragment
+def heatmap(cross_filter):
+    st.subheader("Interactive Correlation Heatmap")
+    # Full matrix is computed once per dataset/filter/selection state; column choices are slices of it.
+    # The filtered view is only built when that state has no matrix yet.
+    dataset_key = cross_filter.view_key("heatmap")
+    corr_all = cached_correlation_matrix(dataset_key, lambda: cross_filter.view("heatmap"))
+    selected_columns = st.multiselect("Select Columns for Heatmap (at least 2)", corr_all.columns)
+
+    if len(selected_columns) >= 2:
+        corr = corr_all.loc[selected_columns, selected_columns]
+        # Cell labels are unreadable (and slow to render) on wide selections
+        fig = get_figure_cache().get_or_build(
+            (dataset_key, "heatmap", tuple(selected_columns)),
+            lambda: px.imshow(corr, text_auto=len(selected_columns) <= 20, aspect="auto",
+                              title="Correlation Heatmap", color_continuous_scale='Viridis'))
+        st.plotly_chart(fig)
+    else:
+        st.warning("Please select at least 2 numerical columns to generate the heatmap.")
+
+    if st.checkbox("Show strongest correlations"):
+        top_k = st.number_input("Number of pairs", min_value=1, max_value=500, value=20)
+        st.dataframe(top_correlations(corr_all, int(top_k)), hide_index=True)
+
 
 def show_page():
     # Title of the app
     st.title("Interactive Dashboard")
-    
+
     # Sidebar for CSV Input
     st.sidebar.header("Upload your CSV file")
     csv_file = st.sidebar.file_uploader("Choose a CSV file", type="csv")
-    
-    # Caching the data loading to optimize performance
-    @st.cache_data
-    def load_data(file):
-        return pd.read_csv(file, encoding='ISO-8859-1')
-    
+
     # Check if the file is uploaded and load the dataset
     if csv_file:
         try:
             # Load dataset once using cache
-            df = load_data(csv_file)
+            dataset_key = file_fingerprint(csv_file)
+            df = load_data(dataset_key, csv_file)
             st.sidebar.subheader("Preview Data")
-    
+
             # Show a checkbox for data preview (sampled to optimize performance)
             if st.sidebar.checkbox("Preview the dataset"):
                 st.write(df.head(100))  # Show only first 100 rows for preview
-    
+
             # Show a checkbox for summary statistics (optional)
             if st.sidebar.checkbox("Show Summary Statistics"):
                 st.write(df.describe())
-    
+
             # Filter Option
             st.sidebar.subheader("Filter Data")
-            filter_column = st.sidebar.selectbox("Select a column to filter by", ['None'] + df.columns.tolist())
-    
-            # Apply filter based on user selection
-            if filter_column != 'None':
-                unique_values = ['None'] + df[filter_column].unique().tolist()
-                selected_value = st.sidebar.selectbox(f"Select a value from {filter_column}", unique_values)
-    
-                # If a specific value is selected, filter the dataset
-                if selected_value != 'None':
-                    df = df[df[filter_column] == selected_value]
-    
+            filter_index = get_filter_index(dataset_key, df)
+            filter_columns = st.sidebar.multiselect("Select columns to filter by", df.columns.tolist())
+
+            # Each filter resolves to a precomputed row bitmap; stacked filters are ANDed
+            filters = []
+            for filter_column in filter_columns:
+                if filter_index.is_numeric(filter_column):
+                    value_range = filter_index.value_range(filter_column)
+                    if value_range is None or value_range[0] == value_range[1]:
+                        continue
+                    selected_range = st.sidebar.slider(f"Select a range of {filter_column}",
+                                                       value_range[0], value_range[1], value_range)
+                    if tuple(selected_range) != value_range:
+                        filters.append((filter_column, "range", tuple(selected_range)))
+                else:
+                    selected_values = st.sidebar.multiselect(f"Select values from {filter_column}",
+                                                             filter_index.categories(filter_column))
+                    if selected_values:
+                        filters.append((filter_column, "in", tuple(selected_values)))
+
+            # If any filter is active, filter the dataset
+            if filters:
+                df = filter_data(dataset_key, filter_index, tuple(filters))
+                dataset_key = state_fingerprint(dataset_key, tuple(filters))
+
+            # Selections made inside charts filter every other chart
+            cross_filter = CrossFilter(get_filter_index(dataset_key, df), dataset_key)
+            if cross_filter.selections:
+                st.sidebar.button("Clear chart selections", on_click=cross_filter.clear)
+
             # Graph Selection
             st.sidebar.subheader("Select Graphs")
             graph_options = []
@@ -65,7 +236,7 @@ def show_page():
                 graph_options.append("Treemap")
             if st.sidebar.checkbox("Correlation Heatmap"):
                 graph_options.append("Correlation Heatmap")
-    
+
             # Color Pickers
             st.sidebar.subheader("Graph Colors")
             bar_color = st.sidebar.color_picker('Select Bar Plot Color', '#00f900')
@@ -76,119 +247,55 @@ def show_page():
             box_color = st.sidebar.color_picker('Select Box Plot Color', '#ff6347')
             bubble_color = st.sidebar.color_picker('Select Bubble Chart Color', '#ff8c00')
             treemap_color = st.sidebar.color_picker('Select Treemap Color', '#ff6600')
-    
+
+            # Figure cache counters, for sizing the cache
+            if st.sidebar.checkbox("Show figure cache stats"):
+                st.sidebar.json(get_figure_cache().stats())
+
             # Arrange graphs alternately
             col1, col2 = st.columns(2)
             graph_counter = 0  # Initialize the counter
-    
-            def assign_column(graph_component):
+
+            def assign_column(graph_component, *args):
                 """Assigns the current graph to col1 or col2 based on the counter."""
                 nonlocal graph_counter  # Declare graph_counter as nonlocal
                 if graph_counter % 2 == 0:
                     with col1:
-                        graph_component()
+                        graph_component(*args)
                 else:
                     with col2:
-                        graph_component()
+                        graph_component(*args)
                 graph_counter += 1  # Increment the counter
-    
+
             # Generating graphs
             if "Bar Plot" in graph_options:
-                def bar_plot():
-                    st.subheader("Interactive Bar Plot")
-                    x_axis = st.selectbox('Select X-axis:', df.columns)
-                    y_axis = st.selectbox('Select Y-axis:', df.select_dtypes(['number']).columns)
-                    fig = px.bar(df, x=x_axis, y=y_axis, title="Bar Plot", color_discrete_sequence=[bar_color])
-                    st.plotly_chart(fig)
-    
-                assign_column(bar_plot)
-    
+                assign_column(bar_plot, cross_filter, bar_color)
+
             if "Pie Chart" in graph_options:
-                def pie_chart():
-                    st.subheader("Interactive Pie Chart")
-                    category_column = st.selectbox('Select Categorical Column for Pie Chart', df.select_dtypes(['object']).columns)
-                    fig = px.pie(df, names=category_column, title="Pie Chart", color_discrete_sequence=[pie_color])
-                    st.plotly_chart(fig)
-    
-                assign_column(pie_chart)
-    
+                assign_column(pie_chart, cross_filter, pie_color)
+
             if "Time Series Plot" in graph_options:
-                def time_series_plot():
-                    st.subheader("Interactive Time Series Plot")
-                    date_column = st.selectbox("Select Date Column", df.select_dtypes(['object', 'datetime']).columns)
-                    value_column = st.selectbox("Select Value Column", df.select_dtypes(['number']).columns)
-                    fig = px.line(df, x=date_column, y=value_column, title="Time Series Plot",
-                                  line_shape='linear', color_discrete_sequence=[line_color])
-                    st.plotly_chart(fig)
-    
-                assign_column(time_series_plot)
-    
+                assign_column(time_series_plot, cross_filter, line_color)
+
             if "Scatter Plot" in graph_options:
-                def scatter_plot():
-                    st.subheader("Interactive Scatter Plot")
-                    x_axis = st.selectbox('Select X-axis for Scatter Plot:', df.select_dtypes(['number']).columns)
-                    y_axis = st.selectbox('Select Y-axis for Scatter Plot:', df.select_dtypes(['number']).columns)
-                    fig = px.scatter(df, x=x_axis, y=y_axis, title="Scatter Plot", color_discrete_sequence=[scatter_color])
-                    st.plotly_chart(fig)
-    
-                assign_column(scatter_plot)
-    
+                assign_column(scatter_plot, cross_filter, scatter_color)
+
             if "Histogram" in graph_options:
-                def histogram():
-                    st.subheader("Interactive Histogram")
-                    hist_column = st.selectbox("Select Column for Histogram", df.select_dtypes(['number']).columns)
-                    fig = px.histogram(df, x=hist_column, title="Histogram", color_discrete_sequence=[histogram_color])
-                    st.plotly_chart(fig)
-    
-                assign_column(histogram)
-    
+                assign_column(histogram, cross_filter, histogram_color)
+
             if "Box Plot" in graph_options:
-                def box_plot():
-                    st.subheader("Interactive Box Plot")
-                    y_axis = st.selectbox("Select Y-axis for Box Plot", df.select_dtypes(['number']).columns)
-                    fig = px.box(df, y=y_axis, title="Box Plot", color_discrete_sequence=[box_color])
-                    st.plotly_chart(fig)
-    
-                assign_column(box_plot)
-    
+                assign_column(box_plot, cross_filter, box_color)
+
             if "Bubble Chart" in graph_options:
-                def bubble_chart():
-                    st.subheader("Interactive Bubble Chart")
-                    x_axis = st.selectbox("Select X-axis for Bubble Chart", df.select_dtypes(['number']).columns)
-                    y_axis = st.selectbox("Select Y-axis for Bubble Chart", df.select_dtypes(['number']).columns)
-                    size_column = st.selectbox("Select Size Column for Bubble Chart", df.select_dtypes(['number']).columns)
-                    fig = px.scatter(df, x=x_axis, y=y_axis, size=size_column, title="Bubble Chart", color_discrete_sequence=[bubble_color])
-                    st.plotly_chart(fig)
-    
-                assign_column(bubble_chart)
-    
+                assign_column(bubble_chart, cross_filter, bubble_color)
+
             if "Treemap" in graph_options:
-                def treemap():
-                    st.subheader("Interactive Treemap")
-                    category_column = st.selectbox("Select Category for Treemap", df.select_dtypes(['object']).columns)
-                    value_column = st.selectbox("Select Value for Treemap", df.select_dtypes(['number']).columns)
-                    fig = px.treemap(df, path=[category_column], values=value_column, title="Treemap", color_discrete_sequence=[treemap_color])
-                    st.plotly_chart(fig)
-    
-                assign_column(treemap)
-    
+                assign_column(treemap, cross_filter, treemap_color)
+
             if "Correlation Heatmap" in graph_options:
-                def heatmap():
-                    st.subheader("Interactive Correlation Heatmap")
-                    selected_columns = st.multiselect("Select Columns for Heatmap (at least 2)", df.select_dtypes(['number']).columns)
-    
-                    if len(selected_columns) >= 2:
-                        corr = df[selected_columns].corr()
-                        fig = px.imshow(corr, text_auto=True, aspect="auto", title="Correlation Heatmap",
-                                        color_continuous_scale='Viridis')
-                        st.plotly_chart(fig)
-                    else:
-                        st.warning("Please select at least 2 numerical columns to generate the heatmap.")
-    
-                assign_column(heatmap)
-    
+                assign_column(heatmap, cross_filter)
+
         except Exception as e:
             st.error(f"Error: {str(e)}")
     else:
         st.write("Please upload a valid CSV file to start.")
-
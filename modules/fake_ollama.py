@@ -0,0 +1,244 @@
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _words(text):
+    return re.findall(r"\S+\s*", text)
+
+
+def _last_user_text(messages):
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content") or ""
+    return ""
+
+
+def extract_fields(text):
+    """``key: value`` lines of a row document (the CSVLoader format), in order."""
+    fields = []
+    for line in text.splitlines():
+        key, sep, value = line.partition(":")
+        if sep and key.strip() and value.strip():
+            fields.append((key.strip(), value.strip()))
+    return fields
+
+
+def graph_relations(text):
+    """Deterministic extraction per blank-line separated record: its first field is the entity, the other fields hang off it."""
+    relations = []
+    for record in re.split(r"\n\s*\n", text.strip()):
+        fields = extract_fields(record)
+        if not fields:
+            continue
+        head_key, head = fields[0]
+        relations.extend(
+            {
+                "head": head,
+                "head_type": head_key.title().replace(" ", ""),
+                "relation": "HAS_" + re.sub(r"\W+", "_", key).strip("_").upper(),
+                "tail": value,
+                "tail_type": key.title().replace(" ", ""),
+            }
+            for key, value in fields[1:]
+        )
+    return relations
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.fake.record(self.path)
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": name, "model": name} for name in self.fake.models]})
+        elif self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.fake.record(self.path)
+        if self.fake.fail_every and self.fake.calls_total() % self.fake.fail_every == 0:
+            self._send_json({"error": "injected failure"}, status=503)
+            return
+        if self.path == "/api/chat":
+            message = self.fake.chat_reply(request)
+            self._respond(request, message.get("content", ""), lambda chunk: {"message": {**message, "content": chunk}})
+        elif self.path == "/api/generate":
+            text = self.fake.generate_reply(request)
+            self._respond(request, text, lambda chunk: {"response": chunk})
+        elif self.path == "/api/show":
+            self._send_json({"modelfile": "", "parameters": "", "template": "", "details": {}})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _respond(self, request, text, wrap):
+        started = time.perf_counter()
+        time.sleep(self.fake.latency)
+        words = _words(text) or [""]
+        delay = 1.0 / self.fake.tokens_per_second if self.fake.tokens_per_second else 0.0
+        base = {"model": request.get("model", ""), "created_at": datetime.now(timezone.utc).isoformat()}
+        stats = {
+            "done_reason": "stop",
+            "prompt_eval_count": sum(len(_words(str(part))) for part in (request.get("messages") or [request.get("prompt", "")])),
+            "eval_count": len(words),
+        }
+
+        if not request.get("stream", True):
+            time.sleep(delay * len(words))
+            stats["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            self._send_json({**base, **wrap(text), "done": True, **stats})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, word in enumerate(words):
+            time.sleep(delay)
+            chunk = wrap(word)
+            if index and "message" in chunk:
+                chunk["message"].pop("tool_calls", None)  # tool calls arrive with the first chunk only
+            self._write_chunk({**base, **chunk, "done": False})
+        stats["total_duration"] = int((time.perf_counter() - started) * 1e9)
+        done = wrap("")
+        if "message" in done:
+            done["message"].pop("tool_calls", None)
+        self._write_chunk({**base, **done, "done": True, **stats})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, payload):
+        data = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOllama:
+    """Local, deterministic stand-in for an Ollama server.
+
+    Speaks enough of the REST API (``/api/chat``, ``/api/generate``,
+    ``/api/tags``) for ChatOllama, OllamaLLM and the ollama client, with a
+    fixed ``latency`` before the first token and ``tokens_per_second``
+    after it (0 disables both). Replies are canned: the pandas agent gets
+    one tool call and then an answer built from the tool output, SQL
+    prompts get a COUNT query, summary prompts a fixed summary, and graph
+    extraction prompts a JSON relation list derived from the row text.
+    ``fail_every`` answers every n-th request with a 503.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, tokens_per_second=0.0, fail_every=0,
+                 tool_query="print(df.shape)"):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.fail_every = fail_every
+        self.tool_query = tool_query
+        self.models = ["qwen2.5:7b-instruct-q8_0", "llama3"]
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), FakeOllamaHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def record(self, path):
+        with self._lock:
+            self.calls[path] += 1
+
+    def calls_total(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+    def chat_reply(self, request):
+        messages = request.get("messages") or []
+        tools = request.get("tools") or []
+        if tools and not any(message.get("role") == "tool" for message in messages):
+            name = tools[0].get("function", {}).get("name", "python_repl_ast")
+            return {
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [{"function": {"name": name, "arguments": {"query": self.tool_query}}}],
+            }
+        if tools:
+            observation = next(m.get("content") or "" for m in reversed(messages) if m.get("role") == "tool")
+            return {"role": "assistant", "content": f"Based on the data, the result is {observation.strip()}."}
+        return {"role": "assistant", "content": self.text_reply(_last_user_text(messages))}
+
+    def generate_reply(self, request):
+        return self.text_reply(request.get("prompt") or "")
+
+    def text_reply(self, prompt):
+        if "knowledge graph" in prompt and "Text:" in prompt:
+            return json.dumps(graph_relations(prompt.rsplit("Text:", 1)[1]))
+        if "DuckDB SQL query" in prompt:
+            return "SELECT COUNT(*) AS row_count FROM df"
+        if prompt.startswith("Summarize the conversation"):
+            return "The user asked questions about the dataset and got numeric answers."
+        return "This is a canned answer from the local test server."
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Ollama server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every n-th request with a 503")
+    args = parser.parse_args()
+
+    fake = FakeOllama(args.host, args.port, args.latency, args.tokens_per_second, args.fail_every)
+    print(f"Fake Ollama listening on {fake.url} (set OLLAMA_URL to point the app at it)")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
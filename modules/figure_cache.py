@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+
+FIGURE_CACHE_SIZE = 128
+FIGURE_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def figure_nbytes(value):
+    """Rough memory held by a figure (or part of one): array buffers, strings and 8 bytes per other scalar."""
+    if hasattr(value, "to_plotly_json"):
+        value = value.to_plotly_json()
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return sum(figure_nbytes(item) for item in value.ravel()) + value.nbytes
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(len(key) + figure_nbytes(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(figure_nbytes(item) for item in value)
+    if isinstance(value, str):
+        return len(value)
+    return 8
+
+
+class FigureCache:
+    """Bounded LRU of built Plotly figures with hit/miss counters.
+
+    Figures are kept as objects and shared by every session, so callers must
+    treat them as read-only; st.plotly_chart only copies them. Entries are
+    evicted past ``maxsize`` figures or ``maxbytes`` of figure data, and a
+    figure larger than ``maxbytes`` on its own is returned without caching.
+    """
+
+    def __init__(self, maxsize=FIGURE_CACHE_SIZE, maxbytes=FIGURE_CACHE_BYTES):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            entry = self._figures.get(key)
+            if entry is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        # Build outside the lock so one slow chart does not block other sessions
+        fig = build()
+        size = figure_nbytes(fig)
+        with self._lock:
+            self.misses += 1
+            if size > self.maxbytes:
+                return fig
+            previous = self._figures.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+            self._figures[key] = (fig, size)
+            self.nbytes += size
+            while len(self._figures) > self.maxsize or self.nbytes > self.maxbytes:
+                _, (_, evicted) = self._figures.popitem(last=False)
+                self.nbytes -= evicted
+        return fig
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._figures),
+                "maxsize": self.maxsize,
+                "bytes": self.nbytes,
+                "maxbytes": self.maxbytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+# One cache per server process, shared by all sessions; keys carry the dataset fingerprint
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
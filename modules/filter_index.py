@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+
+BITMAP_CACHE_SIZE = 256
+
+
+class FilterIndex:
+    """Per-dataset filter indexes, built lazily one column at a time.
+
+    Categorical columns get a category-code to row-list (posting list) index,
+    numeric columns a sorted value array. Every filter resolves to a packed
+    row bitmap, and stacked filters are combined with a bitwise AND.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.n_rows = len(df)
+        self._categorical = {}
+        self._numeric = {}
+        self._values = {}
+        self._bitmaps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_numeric(self, column):
+        dtype = self.df[column].dtype
+        return is_numeric_dtype(dtype) and not is_bool_dtype(dtype)
+
+    def _categorical_index(self, column):
+        index = self._categorical.get(column)
+        if index is None:
+            codes, uniques = pd.factorize(self.df[column], use_na_sentinel=True)
+            # Shift so nulls (-1) become code 0 and sort rows by code once;
+            # the rows of each category are then one contiguous slice.
+            shifted = codes + 1
+            order = np.argsort(shifted, kind="stable")
+            offsets = np.concatenate(([0], np.cumsum(np.bincount(shifted, minlength=len(uniques) + 1))))
+            lookup = {value: code for code, value in enumerate(uniques.tolist())}
+            index = self._categorical[column] = (uniques.tolist(), lookup, order, offsets, codes)
+        return index
+
+    def _numeric_index(self, column):
+        index = self._numeric.get(column)
+        if index is None:
+            values = self.df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            self._values[column] = values
+            order = np.argsort(values, kind="stable")  # NaNs sort last
+            valid = int(np.count_nonzero(~np.isnan(values)))
+            index = self._numeric[column] = (values[order][:valid], order)
+        return index
+
+    def categories(self, column):
+        with self._lock:
+            return self._categorical_index(column)[0]
+
+    def codes(self, column):
+        """Category labels and the per-row category code (-1 for nulls)."""
+        with self._lock:
+            uniques, _, _, _, codes = self._categorical_index(column)
+        return uniques, codes
+
+    def values(self, column):
+        """Row values of a numeric column as float64, nulls as NaN."""
+        with self._lock:
+            values = self._values.get(column)
+            if values is None:
+                values = self._values[column] = self.df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        return values
+
+    def value_range(self, column):
+        with self._lock:
+            sorted_values = self._numeric_index(column)[0]
+        if not len(sorted_values):
+            return None
+        low, high = sorted_values[0], sorted_values[-1]
+        if pd.api.types.is_integer_dtype(self.df[column].dtype):
+            return int(low), int(high)
+        return float(low), float(high)
+
+    def _rows_to_bitmap(self, rows):
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask)
+
+    def _build_bitmap(self, column, kind, payload):
+        if kind == "in":
+            _, lookup, order, offsets, _ = self._categorical_index(column)
+            codes = [lookup[value] + 1 for value in payload if value in lookup]
+            rows = [order[offsets[code]:offsets[code + 1]] for code in codes]
+            return self._rows_to_bitmap(np.concatenate(rows) if rows else np.empty(0, dtype=np.intp))
+        if kind == "range":
+            sorted_values, order = self._numeric_index(column)
+            low, high = payload
+            start = np.searchsorted(sorted_values, low, side="left")
+            stop = np.searchsorted(sorted_values, high, side="right")
+            return self._rows_to_bitmap(order[start:stop])
+        if kind == "rows":
+            return self._rows_to_bitmap(np.asarray(payload, dtype=np.intp))
+        raise ValueError(f"Unknown filter kind: {kind}")
+
+    def bitmap(self, column, kind, payload):
+        key = (column, kind, payload)
+        with self._lock:
+            bitmap = self._bitmaps.get(key)
+            if bitmap is None:
+                bitmap = self._bitmaps[key] = self._build_bitmap(column, kind, payload)
+                while len(self._bitmaps) > BITMAP_CACHE_SIZE:
+                    self._bitmaps.popitem(last=False)
+            else:
+                self._bitmaps.move_to_end(key)
+        return bitmap
+
+    def mask(self, filters):
+        """Boolean row mask for a tuple of (column, kind, payload) filters.
+
+        ``kind`` is "in" (categorical values), "range" (inclusive numeric
+        bounds) or "rows" (explicit row positions; column is ignored).
+        """
+        combined = None
+        for column, kind, payload in filters:
+            bitmap = self.bitmap(column, kind, payload)
+            combined = bitmap.copy() if combined is None else np.bitwise_and(combined, bitmap, out=combined)
+        if combined is None:
+            return np.ones(self.n_rows, dtype=bool)
+        return np.unpackbits(combined, count=self.n_rows).astype(bool)
+
+    def filter(self, filters):
+        return self.df.iloc[np.flatnonzero(self.mask(filters))]
+
+
+@st.cache_resource(max_entries=8)
+def get_filter_index(dataset_key, _df):
+    return FilterIndex(_df)
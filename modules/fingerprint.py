@@ -0,0 +1,21 @@
+import hashlib
+
+import pandas as pd
+
+
+def file_fingerprint(file):
+    """Content hash of an uploaded file, used as a cheap dataset identity."""
+    return hashlib.sha1(file.getvalue()).hexdigest()
+
+
+def frame_fingerprint(df):
+    """Content hash of a DataFrame, including column names and dtypes."""
+    digest = hashlib.sha1()
+    digest.update(repr(list(zip(df.columns, df.dtypes.astype(str)))).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def state_fingerprint(*parts):
+    """Stable hash of a base fingerprint plus any repr-able state."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
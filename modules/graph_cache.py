@@ -0,0 +1,136 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+from modules.graph_packing import PACK_TOKEN_BUDGET
+
+
+CACHE_PATH = os.path.join(".cache", "graph_documents.sqlite")
+MAX_ENTRIES = 200_000
+# Bump when the extraction prompt or post-processing changes so old results are not reused
+EXTRACTION_VERSION = 1
+
+
+def extraction_signature(transformer, model, rows_per_call=1, token_budget=PACK_TOKEN_BUDGET):
+    """Everything besides the row text that changes what the transformer extracts.
+
+    Packed rows share a prompt with their neighbours, so the pack settings
+    are part of the signature whenever ``rows_per_call`` is above 1.
+    """
+    settings = {
+        "version": EXTRACTION_VERSION,
+        "model": model,
+        "allowed_nodes": sorted(transformer.allowed_nodes),
+        "allowed_relationships": sorted(map(str, transformer.allowed_relationships)),
+        "strict_mode": transformer.strict_mode,
+        "function_call": transformer._function_call,
+    }
+    if rows_per_call > 1:
+        settings["pack"] = {"rows_per_call": rows_per_call, "token_budget": token_budget}
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def document_key(document, signature):
+    return hashlib.sha1(f"{signature}\0{document.page_content}".encode()).hexdigest()
+
+
+def _node_dict(node):
+    return {"id": node.id, "type": node.type, "properties": node.properties}
+
+
+def graph_to_json(graph_document):
+    return json.dumps({
+        "nodes": [_node_dict(node) for node in graph_document.nodes],
+        "relationships": [
+            {
+                "source": _node_dict(rel.source),
+                "target": _node_dict(rel.target),
+                "type": rel.type,
+                "properties": rel.properties,
+            }
+            for rel in graph_document.relationships
+        ],
+    }, default=str)
+
+
+def graph_from_json(data, document):
+    data = json.loads(data)
+    return GraphDocument(
+        nodes=[Node(**node) for node in data["nodes"]],
+        relationships=[
+            Relationship(source=Node(**rel["source"]), target=Node(**rel["target"]), type=rel["type"],
+                         properties=rel["properties"])
+            for rel in data["relationships"]
+        ],
+        source=document,
+    )
+
+
+class GraphDocumentCache:
+    """Extracted nodes and relationships on disk, keyed by a hash of row text and extraction settings.
+
+    Rows that did not change between uploads (in any file, in any session)
+    are served from here instead of the LLM. The least recently used
+    entries are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS graphs (key TEXT PRIMARY KEY, graph TEXT, accessed REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS graphs_accessed ON graphs (accessed)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, keys):
+        """Return {key: serialized graph} for the keys that are cached."""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        with self._lock, self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(conn.execute(
+                    f"SELECT key, graph FROM graphs WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+                conn.execute(f"UPDATE graphs SET accessed = ? WHERE key IN ({placeholders})", [time.time(), *chunk])
+        return found
+
+    def put_many(self, items):
+        """Store (key, GraphDocument) pairs."""
+        now = time.time()
+        rows = [(key, graph_to_json(graph_document), now) for key, graph_document in items]
+        with self._lock, self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO graphs VALUES (?, ?, ?)", rows)
+            conn.execute(
+                "DELETE FROM graphs WHERE rowid IN ("
+                " SELECT rowid FROM graphs ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM graphs")
+
+
+@st.cache_resource
+def get_graph_cache():
+    return GraphDocumentCache()
@@ -0,0 +1,161 @@
+import numpy as np
+import streamlit as st
+
+
+MAX_ITERATIONS = 50
+# Share of nodes updated per round; updating all at once makes label propagation oscillate on bipartite parts
+UPDATE_SHARE = 0.8
+# Stop once fewer labels than this share change in a round
+CONVERGED_SHARE = 0.001
+MAX_COMMUNITIES = 150
+# Aggregated relationships drawn per drawn node, heaviest first
+MAX_EDGES_PER_NODE = 4
+COMMUNITY_PREFIX = "community:"
+
+
+def csr_adjacency(sources, targets, n, return_edges=False):
+    """Undirected CSR adjacency ``(indptr, indices)`` from edge index arrays; self loops are dropped.
+
+    With ``return_edges`` the position of each entry's edge in ``sources``
+    and ``targets`` is returned as a third array.
+    """
+    keep = np.flatnonzero(sources != targets)
+    rows = np.concatenate([sources[keep], targets[keep]])
+    cols = np.concatenate([targets[keep], sources[keep]])
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    if return_edges:
+        return indptr, cols[order], np.concatenate([keep, keep])[order]
+    return indptr, cols[order]
+
+
+def label_propagation(indptr, indices, max_iterations=MAX_ITERATIONS, seed=0):
+    """Community label per node by semi-synchronous label propagation.
+
+    Each round a random ``UPDATE_SHARE`` of the nodes takes the label most common among
+    their neighbours (ties broken at random), all in array operations over
+    the CSR edges, until (almost) no node would change its label. Isolated
+    nodes keep their own label.
+    """
+    n = len(indptr) - 1
+    labels = np.arange(n)
+    if not len(indices):
+        return labels
+    rng = np.random.default_rng(seed)
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    for _ in range(max_iterations):
+        # Count (node, neighbour label) pairs, then keep the best label of every node
+        pair_labels, counts = np.unique(rows * n + labels[indices], return_counts=True)
+        pair_rows, pair_labels = np.divmod(pair_labels, n)
+        score = counts + rng.random(len(counts)) * 0.5
+        order = np.lexsort((-score, pair_rows))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = pair_rows[order][1:] != pair_rows[order][:-1]
+        best_rows, best_labels = pair_rows[order][first], pair_labels[order][first]
+
+        # Converged is judged on every node, not only those sampled this round
+        changing = labels[best_rows] != best_labels
+        if np.count_nonzero(changing) <= CONVERGED_SHARE * n:
+            break
+        update = changing & (rng.random(len(best_rows)) < UPDATE_SHARE)
+        labels[best_rows[update]] = best_labels[update]
+    return labels
+
+
+def communities(sources, targets, n, seed=0):
+    """Community per node, numbered by size (0 is the largest), and the node degrees."""
+    indptr, indices = csr_adjacency(sources, targets, n)
+    _, community, sizes = np.unique(label_propagation(indptr, indices, seed=seed), return_inverse=True, return_counts=True)
+    rank = np.empty(len(sizes), dtype=np.int64)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+    return rank[community], np.diff(indptr)
+
+
+@st.cache_data(max_entries=8, show_spinner="Detecting communities...")
+def graph_communities(version, _graph_view):
+    """Node ids, communities and degrees of the whole graph, cached per ``version`` of it."""
+    node_ids, sources, targets = _graph_view.edge_list()
+    community, degree = communities(sources, targets, len(node_ids))
+    return {"node_ids": node_ids, "community": community, "degree": degree, "sources": sources, "targets": targets}
+
+
+def community_id(community):
+    return f"{COMMUNITY_PREFIX}{community}"
+
+
+def level_of_detail(assignment, expanded=(), max_communities=MAX_COMMUNITIES, member_limit=100):
+    """What to draw: the largest communities as super-nodes, with ``expanded`` ones opened up.
+
+    An expanded community shows its ``member_limit`` best connected
+    members; the rest of it stays behind as a smaller super-node.
+    Relationships are aggregated between whatever is drawn, weighted by
+    how many they stand for, keeping the heaviest ``MAX_EDGES_PER_NODE``
+    per drawn node. Returns ``{"communities": {id: (size, hub
+    index)}, "members": [node index], "edges": [(source, target,
+    count)]}`` with nodes given by element id or ``community_id``.
+    """
+    community, degree = assignment["community"], assignment["degree"]
+    node_ids = assignment["node_ids"]
+    # Draw slot per node: a community super-node, one of its own, or -1 (community too small to show)
+    slot = np.where(community < max_communities, community, -1)
+    members = []
+    for c in expanded:
+        index = np.flatnonzero(community == c)
+        top = index[np.argsort(-degree[index], kind="stable")[:member_limit]]
+        slot[top] = max_communities + len(members) + np.arange(len(top))
+        members.extend(top.tolist())
+
+    shown = slot[slot >= 0]
+    sizes = np.bincount(shown[shown < max_communities], minlength=max_communities)
+    hubs = {}
+    for index in np.argsort(-degree, kind="stable"):
+        c = slot[index]
+        if 0 <= c < max_communities and c not in hubs:
+            hubs[c] = index
+            if len(hubs) == np.count_nonzero(sizes):
+                break
+
+    def name(position):
+        return community_id(position) if position < max_communities else node_ids[members[position - max_communities]]
+
+    source, target = slot[assignment["sources"]], slot[assignment["targets"]]
+    keep = (source >= 0) & (target >= 0) & (source != target)
+    # Undirected: A->B and B->A add up to one aggregated relationship
+    pairs = np.sort(np.column_stack([source[keep], target[keep]]), axis=1)
+    pairs, counts = np.unique(pairs, axis=0, return_counts=True)
+    heaviest = np.argsort(-counts, kind="stable")[:MAX_EDGES_PER_NODE * (len(hubs) + len(members))]
+    pairs, counts = pairs[heaviest], counts[heaviest]
+    return {
+        "communities": {community_id(c): (int(sizes[c]), int(hubs[c])) for c in hubs},
+        "members": members,
+        "edges": [(name(s), name(t), int(count)) for (s, t), count in zip(pairs, counts)],
+    }
+
+
+def community_view(graph_view, assignment, expanded=(), member_limit=100):
+    """``level_of_detail`` as a view (see graph_view) with labels fetched for the hubs and members."""
+    detail = level_of_detail(assignment, expanded, member_limit=member_limit)
+    node_ids = assignment["node_ids"]
+    hubs = {cid: node_ids[hub] for cid, (_, hub) in detail["communities"].items()}
+    fetched = graph_view.nodes(list(hubs.values()) + [node_ids[index] for index in detail["members"]])
+    nodes = {}
+    for cid, (size, _) in detail["communities"].items():
+        hub = fetched.get(hubs[cid], {})
+        nodes[cid] = {
+            "id": cid,
+            "label": f"{hub.get('label', cid)} +{size - 1}" if size > 1 else hub.get("label", cid),
+            "group": "Community",
+            "degree": size,
+            "size": 10 + 4 * np.log2(size),
+            "title": f"{size} nodes, click to expand",
+        }
+    for index in detail["members"]:
+        node = fetched.get(node_ids[index])
+        if node:
+            nodes[node["id"]] = node
+    edges = {
+        f"{source}->{target}": {"source": source, "target": target, "label": str(count) if count > 1 else ""}
+        for source, target, count in detail["edges"]
+    }
+    return {"nodes": nodes, "edges": edges}
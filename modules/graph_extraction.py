@@ -0,0 +1,117 @@
+import contextvars
+import time
+from itertools import islice
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from modules.graph_cache import document_key, graph_from_json
+from modules.graph_packing import PACK_TOKEN_BUDGET, pack_documents, unpack_graph_document
+from modules.llm_client import MAX_CONNECTIONS
+
+
+EXTRACTION_WORKERS = MAX_CONNECTIONS
+BATCH_SIZE = 50
+
+
+def _extract_pack(transformer, packed, rows):
+    return unpack_graph_document(transformer.process_response(packed), rows)
+
+
+def extract_in_batches(transformer, documents, workers=EXTRACTION_WORKERS, batch_size=BATCH_SIZE,
+                       rows_per_call=1, token_budget=PACK_TOKEN_BUDGET, total=None):
+    """Run ``transformer.process_response`` over the documents on a bounded thread pool.
+
+    With ``rows_per_call`` above 1, rows are packed into shared documents
+    (see ``pack_documents``) and the results split back per row, so one LLM
+    call covers several rows. Yields ``(graph_documents, stats)`` whenever
+    calls finish, so callers can report progress; ``graph_documents`` holds
+    one document per row and stays empty until ``batch_size`` of them have
+    accumulated (or extraction ends), so partial results can be written in
+    batches while extraction continues. Batches are in completion order.
+    Rows whose call fails are skipped and counted in ``stats["failed"]``;
+    the first errors are kept in ``stats["errors"]``. At most ``2 * workers``
+    calls are in flight, so stopping the generator early abandons little
+    work. ``documents`` may be a lazy iterable (pass ``total`` for progress);
+    rows are only pulled from it as calls are submitted.
+    """
+    stats = {"total": len(documents) if total is None else total, "done": 0, "failed": 0, "calls": 0,
+             "errors": [], "elapsed": 0.0, "docs_per_s": 0.0}
+    started = time.perf_counter()
+    pending = {}
+    batch = []
+    queued = iter(pack_documents(documents, rows_per_call, token_budget))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="graph-extraction")
+
+    def submit_next():
+        pack = next(queued, None)
+        if pack is not None:
+            # Each task gets its own copy of the context so LLM usage stays attributed to the page
+            future = pool.submit(contextvars.copy_context().run, _extract_pack, transformer, *pack)
+            pending[future] = len(pack[1])
+
+    try:
+        for _ in range(2 * workers):
+            submit_next()
+        if not pending:
+            yield [], stats
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                rows = pending.pop(future)
+                submit_next()
+                stats["done"] += rows
+                stats["calls"] += 1
+                try:
+                    batch.extend(future.result())
+                except Exception as e:
+                    stats["failed"] += rows
+                    if len(stats["errors"]) < 5:
+                        stats["errors"].append(f"{type(e).__name__}: {e}")
+            stats["elapsed"] = time.perf_counter() - started
+            stats["docs_per_s"] = stats["done"] / stats["elapsed"] if stats["elapsed"] else 0.0
+            if len(batch) >= batch_size or not pending:
+                yield batch, dict(stats)
+                batch = []
+            else:
+                yield [], dict(stats)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_with_cache(transformer, documents, cache, signature, workers=EXTRACTION_WORKERS, batch_size=BATCH_SIZE,
+                       rows_per_call=1, token_budget=PACK_TOKEN_BUDGET, total=None):
+    """``extract_in_batches`` that serves unchanged rows from the on-disk graph cache.
+
+    Rows are looked up in chunks of ``batch_size`` only when the pool needs
+    more work, so ``documents`` (which may be lazy) is read as extraction
+    goes and the first LLM call does not wait for the whole dataset. Cached
+    rows found on the way are yielded in batches of ``batch_size`` with the
+    next progress update, misses go to the LLM, and each finished batch is
+    stored in the cache. ``stats`` counts cached rows as done and reports
+    them in ``stats["cached"]``.
+    """
+    total = len(documents) if total is None else total
+    base = {"total": total, "cached": 0}
+    hits = []
+    documents = iter(documents)
+
+    def misses():
+        while chunk := list(islice(documents, batch_size)):
+            keys = [document_key(document, signature) for document in chunk]
+            cached = cache.get_many(keys)
+            for key, document in zip(keys, chunk):
+                if key in cached:
+                    hits.append(graph_from_json(cached[key], document))
+                else:
+                    yield document
+
+    for batch, stats in extract_in_batches(transformer, misses(), workers=workers, batch_size=batch_size,
+                                           rows_per_call=rows_per_call, token_budget=token_budget, total=total):
+        if batch:
+            cache.put_many((document_key(graph_document.source, signature), graph_document) for graph_document in batch)
+        served = hits[:]
+        hits.clear()
+        for start in range(0, len(served), batch_size):
+            base["cached"] += len(served[start:start + batch_size])
+            yield served[start:start + batch_size], {**stats, **base, "done": base["cached"] + stats["done"]}
+        if batch or not served:
+            yield batch, {**stats, **base, "done": base["cached"] + stats["done"]}
@@ -0,0 +1,110 @@
+import zlib
+
+import numpy as np
+import streamlit as st
+
+
+BROWSER = "Browser physics"
+FORCE = "Force-directed (server)"
+SPECTRAL = "Spectral (server)"
+LAYOUTS = [BROWSER, FORCE, SPECTRAL]
+
+ITERATIONS = 60
+# Pixels per node on average, so vis.js draws the fixed positions at a readable density
+SPACING = 60
+# Rows of the pairwise repulsion computed at once (memory is rows * nodes * 2 floats)
+CHUNK = 512
+# Force iterations that spread out the spectral layout, which puts tightly knit clusters on one point
+SPECTRAL_REFINE = 15
+
+
+def _edge_index(node_ids, edges):
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    pairs = np.array([(index[s], index[t]) for s, t in edges if s in index and t in index and s != t], dtype=np.int64)
+    return pairs.reshape(-1, 2)
+
+
+def _initial(node_ids):
+    # Seeded by the node id, so a node starts in the same place whenever the view grows
+    angles = np.array([zlib.crc32(str(node_id).encode()) / 2**32 * 2 * np.pi for node_id in node_ids])
+    radii = np.sqrt(np.array([zlib.crc32(str(node_id).encode()[::-1]) / 2**32 for node_id in node_ids]))
+    return np.column_stack([np.cos(angles), np.sin(angles)]) * radii[:, None]
+
+
+def force_layout(node_ids, edges, iterations=ITERATIONS, initial=None):
+    """Fruchterman-Reingold in NumPy: all-pairs repulsion (chunked), spring attraction along edges, cooling steps."""
+    n = len(node_ids)
+    pos = (_initial(node_ids) if initial is None else initial).astype(np.float32)
+    if n < 2:
+        return pos
+    pairs = _edge_index(node_ids, edges)
+    k = 1 / np.sqrt(n)
+    step = 0.1
+    for _ in range(iterations):
+        x, y = pos[:, 0], pos[:, 1]
+        disp = np.empty_like(pos)
+        for start in range(0, n, CHUNK):
+            dx = x[start:start + CHUNK, None] - x[None, :]
+            dy = y[start:start + CHUNK, None] - y[None, :]
+            weight = (k * k) / np.maximum(dx * dx + dy * dy, 1e-6)
+            disp[start:start + CHUNK, 0] = (dx * weight).sum(1)
+            disp[start:start + CHUNK, 1] = (dy * weight).sum(1)
+        if len(pairs):
+            delta = pos[pairs[:, 0]] - pos[pairs[:, 1]]
+            force = delta * (np.sqrt((delta ** 2).sum(-1)) / k)[:, None]
+            for axis in range(2):
+                disp[:, axis] -= np.bincount(pairs[:, 0], force[:, axis], minlength=n)
+                disp[:, axis] += np.bincount(pairs[:, 1], force[:, axis], minlength=n)
+        # Weak gravity keeps disconnected components from drifting apart
+        disp -= pos * (k * n * 0.05)
+        length = np.maximum(np.sqrt((disp ** 2).sum(-1)), 1e-9)
+        pos += disp * (np.minimum(length, step) / length)[:, None]
+        step *= 0.95
+    return pos
+
+
+def spectral_layout(node_ids, edges):
+    """Coordinates from the two smallest non-trivial eigenvectors of the normalized graph Laplacian.
+
+    O(n^3) dense eigendecomposition; fine for the few thousand nodes the view holds.
+    """
+    n = len(node_ids)
+    if n < 3:
+        return _initial(node_ids)
+    pairs = _edge_index(node_ids, edges)
+    adjacency = np.zeros((n, n))
+    adjacency[pairs[:, 0], pairs[:, 1]] = 1
+    adjacency = np.maximum(adjacency, adjacency.T)
+    # A faint link between all nodes keeps disconnected components (and isolated nodes) apart instead of stacked
+    adjacency += 0.01 / n
+    degree = adjacency.sum(1)
+    scale = 1 / np.sqrt(degree)
+    laplacian = np.eye(n) - scale[:, None] * adjacency * scale[None, :]
+    _, vectors = np.linalg.eigh(laplacian)
+    return vectors[:, 1:3] * scale[:, None]
+
+
+def _fit(pos, n):
+    pos = pos - pos.mean(0)
+    extent = np.abs(pos).max() or 1.0
+    return pos / extent * SPACING * np.sqrt(n)
+
+
+@st.cache_data(max_entries=32, show_spinner="Computing layout...")
+def compute_layout(node_ids, edges, method=FORCE):
+    """``{node id: (x, y)}`` in pixels; cached per node and edge set, i.e. per version of the shown graph.
+
+    ``node_ids`` and ``edges`` (``(source, target)`` pairs) are tuples so
+    they hash cheaply.
+    """
+    if not node_ids:
+        return {}
+    if method == SPECTRAL:
+        initial = spectral_layout(node_ids, edges)
+        # Nodes with identical eigenvector entries would feel no repulsion from each other
+        initial = initial / (np.abs(initial).max() or 1.0) + _initial(node_ids) * 1e-3
+        pos = force_layout(node_ids, edges, SPECTRAL_REFINE, initial)
+    else:
+        pos = force_layout(node_ids, edges)
+    pos = _fit(pos, len(node_ids))
+    return {node_id: (float(x), float(y)) for node_id, (x, y) in zip(node_ids, pos)}
@@ -0,0 +1,95 @@
+import re
+
+from langchain_community.graphs.graph_document import GraphDocument
+from langchain_core.documents import Document
+
+from modules.chat_context import estimate_tokens
+
+
+# One row per call unless the user opts in: packing saves calls but can cost recall (see benchmark)
+ROWS_PER_CALL = 1
+PACK_TOKEN_BUDGET = 1500
+ROW_TAG = "# Row {}"
+
+
+def pack_documents(documents, rows_per_call=ROWS_PER_CALL, token_budget=PACK_TOKEN_BUDGET):
+    """Lazily group row documents into ``(packed document, rows)`` pairs, one LLM call each.
+
+    A pack holds at most ``rows_per_call`` rows and stays under
+    ``token_budget`` (a single larger row still gets its own pack). Every
+    row is preceded by a ``# Row <id>`` line, the id being the row's
+    ``metadata["row"]`` or its position, and rows are separated by a blank
+    line. Single-row packs are the row document itself.
+    """
+    rows, size = [], 0
+    for index, document in enumerate(documents):
+        tokens = estimate_tokens(document.page_content)
+        if rows and (len(rows) >= rows_per_call or size + tokens > token_budget):
+            yield _pack(rows)
+            rows, size = [], 0
+        rows.append((document.metadata.get("row", index), document))
+        size += tokens
+    if rows:
+        yield _pack(rows)
+
+
+def _pack(rows):
+    if len(rows) == 1:
+        return rows[0][1], [rows[0][1]]
+    text = "\n\n".join(f"{ROW_TAG.format(row_id)}\n{document.page_content}" for row_id, document in rows)
+    return Document(page_content=text, metadata={"rows": [row_id for row_id, _ in rows]}), [row for _, row in rows]
+
+
+def _row_values(document):
+    values = set()
+    for line in document.page_content.splitlines():
+        _, sep, value = line.partition(":")
+        if sep and value.strip():
+            values.add(value.strip().lower())
+    return values
+
+
+def unpack_graph_document(graph_document, rows):
+    """Split a packed extraction back into one GraphDocument per source row.
+
+    A node belongs to the rows that contain it as a field value, or failing
+    that mention it as a whole word. A relationship belongs to the rows that
+    contain both of its ends, else the rows containing its source, else its
+    target; a relationship no row mentions goes to the first row of the pack
+    so nothing extracted is lost.
+    """
+    if len(rows) == 1:
+        graph_document.source = rows[0]
+        return [graph_document]
+
+    values = [_row_values(row) for row in rows]
+    texts = [row.page_content.lower() for row in rows]
+    owners_cache = {}
+
+    def owners(node):
+        key = node.id.lower() if isinstance(node.id, str) else str(node.id).lower()
+        if key not in owners_cache:
+            found = [i for i, row_values in enumerate(values) if key in row_values]
+            if not found:
+                pattern = re.compile(rf"(?<!\w){re.escape(key)}(?!\w)")
+                found = [i for i, text in enumerate(texts) if pattern.search(text)]
+            owners_cache[key] = found
+        return owners_cache[key]
+
+    nodes = [{} for _ in rows]
+    relationships = [[] for _ in rows]
+    for rel in graph_document.relationships:
+        source_rows, target_rows = owners(rel.source), owners(rel.target)
+        rel_rows = [i for i in source_rows if i in target_rows] or source_rows or target_rows or [0]
+        for i in rel_rows:
+            relationships[i].append(rel)
+            nodes[i][(rel.source.id, rel.source.type)] = rel.source
+            nodes[i][(rel.target.id, rel.target.type)] = rel.target
+    for node in graph_document.nodes:
+        for i in owners(node) or [0]:
+            nodes[i].setdefault((node.id, node.type), node)
+
+    return [
+        GraphDocument(nodes=list(row_nodes.values()), relationships=row_relationships, source=row)
+        for row, row_nodes, row_relationships in zip(rows, nodes, relationships)
+    ]
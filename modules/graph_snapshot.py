@@ -0,0 +1,225 @@
+import itertools
+import threading
+
+import numpy as np
+import streamlit as st
+
+from modules.graph_communities import csr_adjacency
+from modules.graph_view import IN_GRAPH, MAX_EDGES_PER_NODE, MAX_HOPS, MAX_SEEDS, PAGE_SIZE, node_from_record
+
+
+# Longest text kept per node for hover titles (document nodes hold whole rows)
+MAX_TITLE = 300
+_generations = itertools.count(1)
+
+
+def _gather(indptr, rows):
+    """CSR positions of every entry in ``rows``, concatenated, plus the row each belongs to."""
+    starts, ends = indptr[rows], indptr[rows + 1]
+    lengths = ends - starts
+    owners = np.repeat(rows, lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets, owners
+
+
+class GraphSnapshot:
+    """The whole named graph held in memory: integer-indexed node arrays and a CSR adjacency.
+
+    Offers the same queries as ``GraphView`` (and returns the same view
+    dicts), plus ``path``, all answered from NumPy arrays without a round
+    trip to Neo4j. ``edge_list`` and ``version`` feed community detection.
+    A snapshot is immutable; ``SnapshotStore`` swaps in a fresh one after
+    the app writes to the graph.
+    """
+
+    def __init__(self, graph_name, nodes, sources, targets, edge_ids, edge_types):
+        self.graph_name = graph_name
+        self.generation = next(_generations)
+        self.node_ids = [node["id"] for node in nodes]
+        self.index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.labels = np.array([node["label"] for node in nodes], dtype=object)
+        self.groups = np.array([node["group"] for node in nodes], dtype=object)
+        self.titles = [node["title"][:MAX_TITLE] for node in nodes]
+        self.search_keys = [str(node["key"]).lower() for node in nodes]
+        self.sources, self.targets = sources, targets
+        self.edge_ids, self.edge_types = edge_ids, edge_types
+        self.indptr, self.indices, self.edge_positions = csr_adjacency(sources, targets, len(nodes), return_edges=True)
+        self.degree = np.diff(self.indptr)
+        self.by_degree = np.argsort(-self.degree, kind="stable")
+
+    @classmethod
+    def load(cls, driver, graph_name=None):
+        with driver.session() as session:
+            nodes = []
+            for record in session.run(
+                f"MATCH (n) WHERE {IN_GRAPH.format('n')} "
+                "RETURN elementId(n) AS element_id, labels(n) AS labels, properties(n) AS properties, 0 AS degree",
+                graph=graph_name,
+            ):
+                node = node_from_record(record)
+                node["key"] = record["properties"].get("id", "")
+                nodes.append(node)
+            index = {node["id"]: i for i, node in enumerate(nodes)}
+            sources, targets, edge_ids, edge_types = [], [], [], []
+            for record in session.run(
+                f"MATCH (s)-[r]->(t) WHERE {IN_GRAPH.format('r')} "
+                "RETURN elementId(r) AS element_id, elementId(s) AS source, elementId(t) AS target, type(r) AS type",
+                graph=graph_name,
+            ):
+                if record["source"] in index and record["target"] in index:
+                    sources.append(index[record["source"]])
+                    targets.append(index[record["target"]])
+                    edge_ids.append(record["element_id"])
+                    edge_types.append(record["type"])
+        return cls(graph_name, nodes, np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64),
+                   np.array(edge_ids, dtype=object), np.array(edge_types, dtype=object))
+
+    def _indices(self, element_ids):
+        return np.array([self.index[element_id] for element_id in element_ids if element_id in self.index],
+                        dtype=np.int64)
+
+    def nodes(self, element_ids):
+        return {
+            self.node_ids[i]: {
+                "id": self.node_ids[i],
+                "label": self.labels[i],
+                "group": self.groups[i],
+                "degree": int(self.degree[i]),
+                "title": self.titles[i],
+            }
+            for i in self._indices(element_ids)
+        }
+
+    def _subgraph(self, rows, known=()):
+        rows = np.unique(rows)
+        if not len(rows):
+            return {"nodes": {}, "edges": {}}
+        allowed = np.zeros(len(self.node_ids), dtype=bool)
+        allowed[rows] = True
+        allowed[self._indices(known)] = True
+        positions, _ = _gather(self.indptr, rows)
+        edges = np.unique(self.edge_positions[positions[allowed[self.indices[positions]]]])
+        edges = edges[:MAX_EDGES_PER_NODE * len(rows)]
+        return {
+            "nodes": self.nodes(self.node_ids[i] for i in rows),
+            "edges": {
+                self.edge_ids[e]: {
+                    "source": self.node_ids[self.sources[e]],
+                    "target": self.node_ids[self.targets[e]],
+                    "label": self.edge_types[e],
+                }
+                for e in edges
+            },
+        }
+
+    def top_degree(self, limit=PAGE_SIZE, offset=0, known=()):
+        return self._subgraph(self.by_degree[offset:offset + limit], known)
+
+    def sample(self, limit=PAGE_SIZE, known=()):
+        rng = np.random.default_rng()
+        return self._subgraph(rng.choice(len(self.node_ids), min(limit, len(self.node_ids)), replace=False), known)
+
+    def _bfs(self, seeds, hops, limit=None, targets=None):
+        """Nodes reached from ``seeds`` within ``hops``, nearest first, and each one's BFS parent.
+
+        Stops early once ``limit`` nodes or any of ``targets`` are reached.
+        """
+        parent = np.full(len(self.node_ids), -2, dtype=np.int64)
+        parent[seeds] = -1
+        order, frontier = [seeds], seeds
+        for _ in range(hops):
+            if limit is not None and sum(map(len, order)) >= limit:
+                break
+            if targets is not None and (parent[targets] != -2).any():
+                break
+            positions, owners = _gather(self.indptr, frontier)
+            neighbours = self.indices[positions]
+            new = parent[neighbours] == -2
+            frontier, first = np.unique(neighbours[new], return_index=True)
+            if not len(frontier):
+                break
+            parent[frontier] = owners[new][first]
+            order.append(frontier)
+        reached = np.concatenate(order)
+        return (reached if limit is None else reached[:limit]), parent
+
+    def _search(self, search):
+        # A plain scan beats np.char here by an order of magnitude
+        search = search.lower()
+        matches = [i for i, key in enumerate(self.search_keys) if search in key]
+        # Shortest ids first: the closest matches to what was typed
+        matches.sort(key=lambda i: len(self.search_keys[i]))
+        return np.array(matches[:MAX_SEEDS], dtype=np.int64)
+
+    def neighborhood(self, search, hops=1, limit=PAGE_SIZE, known=()):
+        seeds = self._search(search)
+        if not len(seeds):
+            return {"nodes": {}, "edges": {}}
+        reached, _ = self._bfs(seeds, min(hops, MAX_HOPS), limit)
+        return self._subgraph(reached, known)
+
+    def expand(self, element_id, limit=PAGE_SIZE, offset=0, known=()):
+        row = self.index.get(element_id)
+        if row is None:
+            return {"nodes": {}, "edges": {}}
+        neighbours = np.unique(self.indices[self.indptr[row]:self.indptr[row + 1]])
+        neighbours = neighbours[np.argsort(-self.degree[neighbours], kind="stable")][offset:offset + limit]
+        return self._subgraph(np.append(neighbours, row), known)
+
+    def path(self, source_search, target_search, max_hops=2 * MAX_HOPS, known=()):
+        """A shortest path between the best matches for two searches, ignoring direction."""
+        sources, targets = self._search(source_search), self._search(target_search)
+        targets = targets[targets != sources[0]] if len(sources) else targets
+        if not len(sources) or not len(targets):
+            return {"nodes": {}, "edges": {}}
+        reached, parent = self._bfs(sources[:1], max_hops, targets=targets)
+        hits = targets[np.isin(targets, reached)]
+        if not len(hits):
+            return {"nodes": {}, "edges": {}}
+        path, row = [], hits[0]
+        while row >= 0:
+            path.append(row)
+            row = parent[row]
+        view = self._subgraph(np.array(path), known)
+        # Only the relationships along the path
+        on_path = {frozenset(pair) for pair in zip(path, path[1:])}
+        view["edges"] = {
+            edge_id: edge for edge_id, edge in view["edges"].items()
+            if frozenset((self.index[edge["source"]], self.index[edge["target"]])) in on_path
+        }
+        return view
+
+    def version(self):
+        return self.graph_name, self.generation
+
+    def edge_list(self):
+        return self.node_ids, self.sources, self.targets
+
+
+class SnapshotStore:
+    """One ``GraphSnapshot`` per graph name, loaded on first use and dropped after the app writes."""
+
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def get(self, driver, graph_name):
+        with self._lock:
+            snapshot = self._snapshots.get(graph_name)
+        if snapshot is None:
+            snapshot = GraphSnapshot.load(driver, graph_name)
+            with self._lock:
+                snapshot = self._snapshots.setdefault(graph_name, snapshot)
+        return snapshot
+
+    def invalidate(self, graph_name=None):
+        with self._lock:
+            if graph_name is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(graph_name, None)
+
+
+@st.cache_resource
+def get_snapshot_store():
+    return SnapshotStore()
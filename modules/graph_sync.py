@@ -0,0 +1,202 @@
+import hashlib
+from collections import defaultdict
+
+from modules.graph_writer import Neo4jBulkWriter, bump_write_generation, quote
+
+
+ENTITY_LABEL = "__Entity__"
+DOCUMENT_LABEL = "Document"
+
+
+def _labels(node_type):
+    # Same layout as Neo4jGraph.add_graph_documents(baseEntityLabel=True, include_source=True)
+    if node_type == DOCUMENT_LABEL:
+        return quote(DOCUMENT_LABEL)
+    return f"{quote(ENTITY_LABEL)}:{quote(node_type)}"
+
+
+def _node_type(labels):
+    if DOCUMENT_LABEL in labels:
+        return DOCUMENT_LABEL
+    return next((label for label in labels if label != ENTITY_LABEL), ENTITY_LABEL)
+
+
+def _clean(properties):
+    """Neo4j only stores primitives and lists of them."""
+    return {
+        key: value if isinstance(value, (str, int, float, bool)) or value is None else str(value)
+        for key, value in (properties or {}).items()
+        if key not in ("id", "graphs")
+    }
+
+
+def document_id(document):
+    return document.metadata.get("id") or hashlib.md5(document.page_content.encode("utf-8")).hexdigest()
+
+
+def graph_items(graph_documents):
+    """Flatten GraphDocuments into keyed nodes and relationships.
+
+    Nodes are keyed by (type, id) and relationships by (source key, type,
+    target key). Each source document becomes a Document node that
+    MENTIONS the nodes extracted from it.
+    """
+    nodes = {}
+    relationships = {}
+    for graph_document in graph_documents:
+        for node in graph_document.nodes:
+            key = (node.type, str(node.id))
+            nodes[key] = {**nodes.get(key, {}), **_clean(node.properties)}
+        for rel in graph_document.relationships:
+            source, target = (rel.source.type, str(rel.source.id)), (rel.target.type, str(rel.target.id))
+            nodes.setdefault(source, _clean(rel.source.properties))
+            nodes.setdefault(target, _clean(rel.target.properties))
+            relationships[(source, rel.type, target)] = _clean(rel.properties)
+        if graph_document.source is not None:
+            document = (DOCUMENT_LABEL, document_id(graph_document.source))
+            nodes[document] = {"text": graph_document.source.page_content, **_clean(graph_document.source.metadata)}
+            for node in graph_document.nodes:
+                relationships[(document, "MENTIONS", (node.type, str(node.id)))] = {}
+    return nodes, relationships
+
+
+class GraphSync:
+    """Incrementally syncs GraphDocuments into Neo4j under a named graph.
+
+    Every node and relationship written here lists the graph names that
+    contain it in a ``graphs`` property. ``upsert`` compares batches with a
+    snapshot of what the graph held when the sync started and only writes
+    new or changed items, one MERGE statement per label group, through a
+    ``Neo4jBulkWriter`` (which also creates the id constraints first).
+    ``remove_stale`` then drops the graph from items it no longer contains
+    and deletes those no graph uses any more, leaving everything else in
+    the database alone; the ``*_removed`` counts are what it deleted.
+    """
+
+    def __init__(self, driver, graph_name, writer=None):
+        self.driver = driver
+        self.graph_name = graph_name
+        self.writer = writer or Neo4jBulkWriter(driver)
+        self.stored_nodes = {}
+        self.stored_relationships = {}
+        self.seen_nodes = set()
+        self.seen_relationships = set()
+        self.counts = defaultdict(int)
+
+    def load(self):
+        with self.driver.session() as session:
+            for record in session.run(
+                "MATCH (n) WHERE $graph IN n.graphs RETURN labels(n) AS labels, n.id AS id, properties(n) AS properties",
+                graph=self.graph_name,
+            ):
+                self.stored_nodes[(_node_type(record["labels"]), str(record["id"]))] = _clean(record["properties"])
+            for record in session.run(
+                "MATCH (s)-[r]->(t) WHERE $graph IN s.graphs AND $graph IN r.graphs "
+                "RETURN labels(s) AS source_labels, s.id AS source, type(r) AS type, "
+                "labels(t) AS target_labels, t.id AS target, properties(r) AS properties",
+                graph=self.graph_name,
+            ):
+                key = (
+                    (_node_type(record["source_labels"]), str(record["source"])),
+                    record["type"],
+                    (_node_type(record["target_labels"]), str(record["target"])),
+                )
+                self.stored_relationships[key] = _clean(record["properties"])
+        return self
+
+    def upsert(self, graph_documents):
+        nodes, relationships = graph_items(graph_documents)
+        self.seen_nodes.update(nodes)
+        self.seen_relationships.update(relationships)
+
+        node_groups = defaultdict(list)
+        for (node_type, node_id), properties in nodes.items():
+            stored = self.stored_nodes.get((node_type, node_id))
+            if stored is not None and stored == properties:
+                self.counts["nodes_unchanged"] += 1
+                continue
+            self.counts["nodes_created" if stored is None else "nodes_updated"] += 1
+            self.stored_nodes[(node_type, node_id)] = properties
+            node_groups[node_type].append({"id": node_id, "properties": properties})
+
+        rel_groups = defaultdict(list)
+        for (source, rel_type, target), properties in relationships.items():
+            stored = self.stored_relationships.get((source, rel_type, target))
+            if stored is not None and stored == properties:
+                self.counts["relationships_unchanged"] += 1
+                continue
+            self.counts["relationships_created" if stored is None else "relationships_updated"] += 1
+            self.stored_relationships[(source, rel_type, target)] = properties
+            rel_groups[(source[0], rel_type, target[0])].append(
+                {"source": source[1], "target": target[1], "properties": properties}
+            )
+
+        self.writer.ensure_unique(node_groups)
+        for node_type, rows in node_groups.items():
+            self.writer.write(
+                f"MERGE (n:{_labels(node_type)} {{id: row.id}}) "
+                "WITH n, row, coalesce(n.graphs, []) AS graphs "
+                # Replace the properties so ones the new extraction dropped go too; id and graphs are ours
+                "SET n = row.properties, n.id = row.id, "
+                "n.graphs = CASE WHEN $graph IN graphs THEN graphs ELSE graphs + $graph END",
+                rows, kind="nodes", graph=self.graph_name,
+            )
+        # Relationships after nodes, so both ends exist
+        for (source_type, rel_type, target_type), rows in rel_groups.items():
+            self.writer.write(
+                f"MATCH (s:{_labels(source_type)} {{id: row.source}}) "
+                f"MATCH (t:{_labels(target_type)} {{id: row.target}}) "
+                f"MERGE (s)-[r:{quote(rel_type)}]->(t) "
+                "WITH r, row, coalesce(r.graphs, []) AS graphs "
+                "SET r = row.properties, r.graphs = CASE WHEN $graph IN graphs THEN graphs ELSE graphs + $graph END",
+                rows, kind="relationships", graph=self.graph_name,
+            )
+        return self.counts
+
+    def remove_stale(self):
+        """Remove what the graph held before but no upserted batch contained."""
+        stale_relationships = defaultdict(list)
+        for source, rel_type, target in set(self.stored_relationships) - self.seen_relationships:
+            stale_relationships[(source[0], target[0])].append(
+                {"source": source[1], "type": rel_type, "target": target[1]}
+            )
+        stale_nodes = defaultdict(list)
+        for node_type, node_id in set(self.stored_nodes) - self.seen_nodes:
+            stale_nodes[node_type].append({"id": node_id})
+
+        for (source_type, target_type), rows in stale_relationships.items():
+            self.counts["relationships_removed"] += self.writer.write(
+                f"MATCH (s:{_labels(source_type)} {{id: row.source}})-[r]->(t:{_labels(target_type)} {{id: row.target}}) "
+                "WHERE type(r) = row.type AND $graph IN r.graphs "
+                "SET r.graphs = [g IN r.graphs WHERE g <> $graph] "
+                "WITH r WHERE size(r.graphs) = 0 DELETE r",
+                rows, kind="removed", graph=self.graph_name,
+            )["relationships_deleted"]
+        for node_type, rows in stale_nodes.items():
+            self.counts["nodes_removed"] += self.writer.write(
+                f"MATCH (n:{_labels(node_type)} {{id: row.id}}) WHERE $graph IN n.graphs "
+                "SET n.graphs = [g IN n.graphs WHERE g <> $graph] "
+                "WITH n WHERE size(n.graphs) = 0 DETACH DELETE n",
+                rows, kind="removed", graph=self.graph_name,
+            )["nodes_deleted"]
+        for key in set(self.stored_relationships) - self.seen_relationships:
+            del self.stored_relationships[key]
+        for key in set(self.stored_nodes) - self.seen_nodes:
+            del self.stored_nodes[key]
+        return self.counts
+
+
+def reset_database(driver, chunk_size=10_000):
+    """Delete every node and relationship, in chunks so no single transaction holds the whole graph."""
+    deleted = 0
+    with driver.session() as session:
+        while True:
+            count = session.execute_write(
+                lambda tx: tx.run(
+                    "MATCH (n) WITH n LIMIT $limit DETACH DELETE n RETURN count(*) AS deleted", limit=chunk_size
+                ).single()["deleted"]
+            )
+            bump_write_generation()
+            deleted += count
+            if count < chunk_size:
+                return deleted
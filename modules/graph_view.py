@@ -0,0 +1,182 @@
+import numpy as np
+
+from modules.graph_sync import DOCUMENT_LABEL, ENTITY_LABEL
+from modules.graph_writer import write_generation
+
+
+PAGE_SIZE = 200
+MAX_NODES = 2000
+MAX_HOPS = 3
+MAX_SEEDS = 5
+# Edges among the fetched nodes, per request; dense hubs could otherwise return far more than the nodes
+MAX_EDGES_PER_NODE = 10
+
+# Restricts a match to the named graph when one is given (see graph_sync)
+IN_GRAPH = "($graph IS NULL OR $graph IN {0}.graphs)"
+
+
+def node_from_record(record):
+    labels = [label for label in record["labels"] if label != ENTITY_LABEL]
+    properties = record["properties"]
+    group = labels[0] if labels else ENTITY_LABEL
+    if group == DOCUMENT_LABEL:
+        label = (properties.get("text") or "")[:40] or properties.get("id")
+    else:
+        label = properties.get("name") or properties.get("id")
+    return {
+        "id": record["element_id"],
+        "label": str(label if label is not None else record["element_id"]),
+        "group": group,
+        "degree": record["degree"],
+        "title": "\n".join(f"{key}: {value}" for key, value in properties.items() if key != "graphs"),
+    }
+
+
+class GraphView:
+    """Bounded subgraphs of the Neo4j graph for the visualization.
+
+    Every query returns at most ``limit`` nodes plus the relationships among
+    them (capped too), as ``{"nodes": {element id: node}, "edges": {element
+    id: edge}}`` dicts the page merges into what it already shows, so
+    paging and expanding only transfer what is new.
+    """
+
+    def __init__(self, driver, graph_name=None):
+        self.driver = driver
+        self.graph_name = graph_name
+
+    def _run(self, query, **params):
+        with self.driver.session() as session:
+            return list(session.run(query, graph=self.graph_name, **params))
+
+    def nodes(self, element_ids):
+        """``{element id: node}`` with labels, properties and degree."""
+        nodes = {}
+        for record in self._run(
+            "MATCH (n) WHERE elementId(n) IN $ids "
+            "RETURN elementId(n) AS element_id, labels(n) AS labels, properties(n) AS properties, "
+            "COUNT { (n)--() } AS degree",
+            ids=list(element_ids),
+        ):
+            node = node_from_record(record)
+            nodes[node["id"]] = node
+        return nodes
+
+    def _subgraph(self, element_ids, known=()):
+        """Nodes with their degree and the relationships between them (or to ``known`` nodes)."""
+        if not element_ids:
+            return {"nodes": {}, "edges": {}}
+        nodes = self.nodes(element_ids)
+        edges = {}
+        for record in self._run(
+            "MATCH (n)-[r]-(m) WHERE elementId(n) IN $ids AND (elementId(m) IN $ids OR elementId(m) IN $known) "
+            f"AND {IN_GRAPH.format('r')} "
+            "RETURN DISTINCT elementId(r) AS element_id, elementId(startNode(r)) AS source, "
+            "elementId(endNode(r)) AS target, type(r) AS type LIMIT $limit",
+            ids=list(nodes), known=list(known), limit=MAX_EDGES_PER_NODE * len(nodes),
+        ):
+            edges[record["element_id"]] = {"source": record["source"], "target": record["target"], "label": record["type"]}
+        return {"nodes": nodes, "edges": edges}
+
+    def top_degree(self, limit=PAGE_SIZE, offset=0, known=()):
+        """The most connected nodes, ``offset`` onwards (pages of ``limit``)."""
+        records = self._run(
+            f"MATCH (n) WHERE {IN_GRAPH.format('n')} "
+            "WITH n, COUNT { (n)--() } AS degree ORDER BY degree DESC, elementId(n) "
+            "SKIP $offset LIMIT $limit RETURN elementId(n) AS element_id",
+            offset=offset, limit=limit,
+        )
+        return self._subgraph([record["element_id"] for record in records], known)
+
+    def sample(self, limit=PAGE_SIZE, known=()):
+        records = self._run(
+            f"MATCH (n) WHERE {IN_GRAPH.format('n')} "
+            "WITH n ORDER BY rand() LIMIT $limit RETURN elementId(n) AS element_id",
+            limit=limit,
+        )
+        return self._subgraph([record["element_id"] for record in records], known)
+
+    def neighborhood(self, search, hops=1, limit=PAGE_SIZE, known=()):
+        """Nodes within ``hops`` of the entities whose id contains ``search`` (case-insensitive)."""
+        records = self._run(
+            f"MATCH (seed) WHERE {IN_GRAPH.format('seed')} AND toLower(toString(seed.id)) CONTAINS toLower($search) "
+            "WITH seed ORDER BY size(toString(seed.id)) LIMIT $seeds "
+            "CALL apoc.path.subgraphNodes(seed, {maxLevel: $hops, limit: $limit}) YIELD node "
+            "RETURN DISTINCT elementId(node) AS element_id LIMIT $limit",
+            search=search, seeds=MAX_SEEDS, hops=min(hops, MAX_HOPS), limit=limit,
+        )
+        return self._subgraph([record["element_id"] for record in records], known)
+
+    def expand(self, element_id, limit=PAGE_SIZE, offset=0, known=()):
+        """Neighbours of one node, most connected first, ``offset`` onwards."""
+        records = self._run(
+            f"MATCH (n)--(m) WHERE elementId(n) = $id AND {IN_GRAPH.format('m')} "
+            "WITH DISTINCT m, COUNT { (m)--() } AS degree ORDER BY degree DESC, elementId(m) "
+            "SKIP $offset LIMIT $limit RETURN elementId(m) AS element_id",
+            id=element_id, offset=offset, limit=limit,
+        )
+        return self._subgraph([element_id] + [record["element_id"] for record in records], known)
+
+    def path(self, source_search, target_search, max_hops=2 * MAX_HOPS, known=()):
+        """A shortest path between the best matches for two searches, ignoring direction."""
+        records = self._run(
+            f"MATCH (a) WHERE {IN_GRAPH.format('a')} AND toLower(toString(a.id)) CONTAINS toLower($source) "
+            "WITH a ORDER BY size(toString(a.id)) LIMIT 1 "
+            f"MATCH (b) WHERE {IN_GRAPH.format('b')} AND toLower(toString(b.id)) CONTAINS toLower($target) AND b <> a "
+            "WITH a, b ORDER BY size(toString(b.id)) LIMIT $seeds "
+            f"MATCH p = shortestPath((a)-[*..{int(max_hops)}]-(b)) "
+            "RETURN [n IN nodes(p) | elementId(n)] AS nodes, [r IN relationships(p) | {id: elementId(r), "
+            "source: elementId(startNode(r)), target: elementId(endNode(r)), type: type(r)}] AS relationships "
+            "ORDER BY length(p) LIMIT 1",
+            source=source_search, target=target_search, seeds=MAX_SEEDS,
+        )
+        if not records:
+            return {"nodes": {}, "edges": {}}
+        return {
+            "nodes": self.nodes(records[0]["nodes"]),
+            "edges": {
+                rel["id"]: {"source": rel["source"], "target": rel["target"], "label": rel["type"]}
+                for rel in records[0]["relationships"]
+            },
+        }
+
+    def version(self):
+        """Changes whenever the graph does.
+
+        The write generation (see graph_writer) covers this process's writes;
+        node and relationship counts catch most writes made elsewhere.
+        """
+        record = self._run(
+            f"MATCH (n) WHERE {IN_GRAPH.format('n')} "
+            "WITH n, COUNT { (n)-->() } AS outgoing RETURN count(n) AS nodes, sum(outgoing) AS relationships"
+        )[0]
+        return self.graph_name, write_generation(), record["nodes"], record["relationships"]
+
+    def edge_list(self):
+        """Every node and relationship of the graph as element ids and ``(source, target)`` index arrays.
+
+        Only ids cross the wire, so this stays cheap for graphs far larger
+        than anything that can be drawn.
+        """
+        node_ids = [record["element_id"] for record in self._run(
+            f"MATCH (n) WHERE {IN_GRAPH.format('n')} RETURN elementId(n) AS element_id"
+        )]
+        index = {node_id: i for i, node_id in enumerate(node_ids)}
+        pairs = [
+            (index[record["source"]], index[record["target"]])
+            for record in self._run(
+                f"MATCH (s)-[r]->(t) WHERE {IN_GRAPH.format('r')} "
+                "RETURN elementId(s) AS source, elementId(t) AS target"
+            )
+            if record["source"] in index and record["target"] in index
+        ]
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        return node_ids, pairs[:, 0], pairs[:, 1]
+
+
+def merge_views(view, more):
+    """Add ``more`` to ``view`` in place; returns how many nodes were new."""
+    new = len(more["nodes"].keys() - view["nodes"].keys())
+    view["nodes"].update(more["nodes"])
+    view["edges"].update(more["edges"])
+    return new
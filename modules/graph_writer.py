@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import Counter, defaultdict
+
+from neo4j.exceptions import Neo4jError
+
+
+UNWIND = "unwind"
+APOC = "apoc"
+TRANSACTION_SIZE = 5000
+# Rows sent per apoc.periodic.iterate call; the server still commits every TRANSACTION_SIZE
+APOC_CALL_ROWS = 100_000
+# Update counters reported by write, with their apoc.periodic.iterate updateStatistics names
+COUNTERS = {
+    "nodes_created": "nodesCreated",
+    "nodes_deleted": "nodesDeleted",
+    "relationships_created": "relationshipsCreated",
+    "relationships_deleted": "relationshipsDeleted",
+    "properties_set": "propertiesSet",
+}
+
+# Bumped after every committed write from this process, so caches of graph-derived data can tell it changed
+_write_generation = 0
+_generation_lock = threading.Lock()
+
+
+def quote(name):
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def write_generation():
+    return _write_generation
+
+
+def bump_write_generation():
+    global _write_generation
+    with _generation_lock:
+        _write_generation += 1
+
+
+class Neo4jBulkWriter:
+    """Writes parameter rows to Neo4j in bounded transactions.
+
+    ``write`` takes a Cypher statement that handles one ``row`` (e.g.
+    ``MERGE (n:Label {id: row.id})``) and a list of row dicts. With
+    ``method=UNWIND`` the rows go out as ``UNWIND $rows AS row`` in one
+    managed write transaction per ``transaction_size`` rows; with
+    ``method=APOC`` they are handed to ``apoc.periodic.iterate``, which
+    commits every ``transaction_size`` rows on the server. Throughput per
+    statement kind is kept in ``stats``.
+    """
+
+    def __init__(self, driver, transaction_size=TRANSACTION_SIZE, method=UNWIND):
+        if method not in (UNWIND, APOC):
+            raise ValueError(f"Unknown write method {method!r}")
+        self.driver = driver
+        self.transaction_size = transaction_size
+        self.method = method
+        self.stats = defaultdict(lambda: {"rows": 0, "seconds": 0.0})
+        self._schema = set()
+
+    def ensure_unique(self, labels, key="id"):
+        """Create a uniqueness constraint on ``key`` for each label, once per writer.
+
+        MERGE and the relationship MATCHes look nodes up through it. Labels
+        whose existing data already has duplicates (or an index on the same
+        key) get a plain index instead.
+        """
+        with self.driver.session() as session:
+            for label in labels:
+                if (label, key) in self._schema:
+                    continue
+                try:
+                    session.run(f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{quote(label)}) REQUIRE n.{quote(key)} IS UNIQUE").consume()
+                except Neo4jError:
+                    session.run(f"CREATE INDEX IF NOT EXISTS FOR (n:{quote(label)}) ON (n.{quote(key)})").consume()
+                self._schema.add((label, key))
+
+    def write(self, statement, rows, kind="rows", **params):
+        """Run ``statement`` for every row; returns the server's ``COUNTERS`` summed over all transactions."""
+        counters = Counter()
+        if not rows:
+            return counters
+        started = time.perf_counter()
+        with self.driver.session() as session:
+            if self.method == UNWIND:
+                query = f"UNWIND $rows AS row {statement}"
+                for start in range(0, len(rows), self.transaction_size):
+                    chunk = rows[start:start + self.transaction_size]
+                    summary = session.execute_write(lambda tx: tx.run(query, rows=chunk, **params).consume())
+                    counters.update({name: getattr(summary.counters, name) for name in COUNTERS})
+                    bump_write_generation()
+            else:
+                for start in range(0, len(rows), APOC_CALL_ROWS):
+                    counters.update(self._iterate(session, statement, rows[start:start + APOC_CALL_ROWS], params))
+                    bump_write_generation()
+        self.stats[kind]["rows"] += len(rows)
+        self.stats[kind]["seconds"] += time.perf_counter() - started
+        return counters
+
+    def _iterate(self, session, statement, rows, params):
+        # Relationship batches touch shared nodes, so batches run one after the other
+        result = session.run(
+            "CALL apoc.periodic.iterate('UNWIND $rows AS row RETURN row', $statement, "
+            "{batchSize: $batch_size, parallel: false, params: $params}) "
+            "YIELD failedBatches, errorMessages, updateStatistics "
+            "RETURN failedBatches, errorMessages, updateStatistics",
+            statement=statement, batch_size=self.transaction_size, params={**params, "rows": rows},
+        ).single()
+        if result["failedBatches"]:
+            raise RuntimeError(f"{result['failedBatches']} write batches failed: {result['errorMessages']}")
+        statistics = result["updateStatistics"] or {}
+        return {name: statistics.get(apoc_name, 0) for name, apoc_name in COUNTERS.items()}
+
+    def rows_per_second(self, kind=None):
+        stats = self.stats.values() if kind is None else [self.stats[kind]]
+        rows = sum(item["rows"] for item in stats)
+        seconds = sum(item["seconds"] for item in stats)
+        return rows / seconds if seconds else 0.0
+
+    def summary(self):
+        return {
+            kind: {"rows": item["rows"], "rows_per_s": round(item["rows"] / item["seconds"], 1) if item["seconds"] else 0.0}
+            for kind, item in self.stats.items()
+        }
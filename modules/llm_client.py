@@ -0,0 +1,417 @@
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+import weakref
+
+import httpx
+from langchain_ollama import ChatOllama, OllamaLLM
+from ollama import Options
+
+from modules.llm_metrics import METERED_PATHS, CallMeter
+
+
+MAX_CONNECTIONS = 8
+MAX_KEEPALIVE = 8
+KEEPALIVE_EXPIRY = 300.0
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+DEFAULT_DEADLINE = 300.0
+CONNECT_TIMEOUT = 10.0
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+RETRY_STATUS = {429, 502, 503, 504}
+
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised without touching the network while an endpoint's breaker is open."""
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Bound the total time (all retries included) of the LLM calls made inside the block."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and lets one probe through after ``reset_timeout``."""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_call(self, endpoint):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._probing:
+                raise CircuitOpenError(f"{endpoint} is unavailable (circuit open after {self.failures} failures)")
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class _ResponseStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Passes a response body through while the meter (if any) watches it.
+
+    The call is recorded and the transport's concurrency slot released when
+    the body is closed (or fails), not when the headers arrive.
+    """
+
+    def __init__(self, stream, meter, release):
+        self._stream = stream
+        self._meter = meter
+        self._release = release
+        self._released = False
+        self._lock = threading.Lock()
+
+    def _finish(self, error=None):
+        if self._meter is not None:
+            self._meter.finish(error)
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._release()
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                if self._meter is not None:
+                    self._meter.chunk(chunk)
+                yield chunk
+        except Exception as e:
+            self._finish(e)
+            raise
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                if self._meter is not None:
+                    self._meter.chunk(chunk)
+                yield chunk
+        except Exception as e:
+            self._finish(e)
+            raise
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._finish()
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._finish()
+
+
+class ResilientTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport shared by every client of one Ollama endpoint.
+
+    Wraps a keep-alive connection pool with a concurrency limit, jittered
+    exponential-backoff retries, a per-call deadline and a circuit breaker,
+    and meters every LLM call (tokens, latency, retries) into llm_metrics.
+    It implements both the sync and async transport interfaces so the same
+    object can back the sync and async clients that LangChain creates. One
+    semaphore bounds the calls in flight across both, held from the request
+    until its (streamed) body is closed; asyncio connections cannot move
+    between event loops, so each loop still opens its own pool under it.
+    """
+
+    def __init__(self, endpoint, max_connections=MAX_CONNECTIONS, max_retries=MAX_RETRIES,
+                 default_deadline=DEFAULT_DEADLINE):
+        self.endpoint = endpoint
+        self.max_retries = max_retries
+        self.default_deadline = default_deadline
+        self.breaker = CircuitBreaker()
+        self.retries = 0
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=MAX_KEEPALIVE,
+                                    keepalive_expiry=KEEPALIVE_EXPIRY)
+        self._sync = httpx.HTTPTransport(limits=self._limits)
+        # Async connection pools belong to the event loop that opened them
+        self._async = weakref.WeakKeyDictionary()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _deadline(self):
+        return _deadline.get() or time.monotonic() + self.default_deadline
+
+    @staticmethod
+    def _clip_timeout(request, remaining):
+        timeout = dict(request.extensions.get("timeout") or {})
+        for key in ("connect", "read", "write", "pool"):
+            value = timeout.get(key)
+            timeout[key] = remaining if value is None else min(value, remaining)
+        request.extensions["timeout"] = timeout
+
+    def _backoff(self, attempt, remaining):
+        return min(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)), max(remaining, 0))
+
+    def _should_retry(self, attempt, response=None):
+        if attempt >= self.max_retries:
+            return False
+        return response is None or response.status_code in RETRY_STATUS
+
+    def handle_request(self, request):
+        expires = self._deadline()
+        meter = self._meter(request)
+        try:
+            if not self._slots.acquire(timeout=max(expires - time.monotonic(), 0)):
+                raise self._slot_timeout(request)
+            try:
+                self.breaker.before_call(self.endpoint)
+                attempt = 0
+                while True:
+                    remaining = expires - time.monotonic()
+                    if remaining <= 0:
+                        self.breaker.record_failure()
+                        raise httpx.TimeoutException(f"Deadline exceeded calling {self.endpoint}", request=request)
+                    self._clip_timeout(request, remaining)
+                    try:
+                        response = self._sync.handle_request(request)
+                    except httpx.TransportError:
+                        if not self._should_retry(attempt):
+                            self.breaker.record_failure()
+                            raise
+                    else:
+                        if not self._should_retry(attempt, response):
+                            self._record(response)
+                            # The slot now belongs to the body and is released when it is closed
+                            return self._wrap(response, meter)
+                        response.close()
+                    attempt += 1
+                    self._retried(meter)
+                    time.sleep(self._backoff(attempt, expires - time.monotonic()))
+            except BaseException:
+                self._slots.release()
+                raise
+        except Exception as e:
+            if meter is not None:
+                meter.finish(e)
+            raise
+
+    async def handle_async_request(self, request):
+        expires = self._deadline()
+        meter = self._meter(request)
+        try:
+            # A threading semaphore keeps one limit across all event loops; poll it without blocking the loop
+            while not self._slots.acquire(blocking=False):
+                remaining = expires - time.monotonic()
+                if remaining <= 0:
+                    raise self._slot_timeout(request)
+                await asyncio.sleep(min(0.01, remaining))
+            try:
+                self.breaker.before_call(self.endpoint)
+                transport = self._async.get(asyncio.get_running_loop())
+                if transport is None:
+                    transport = self._async[asyncio.get_running_loop()] = httpx.AsyncHTTPTransport(limits=self._limits)
+                attempt = 0
+                while True:
+                    remaining = expires - time.monotonic()
+                    if remaining <= 0:
+                        self.breaker.record_failure()
+                        raise httpx.TimeoutException(f"Deadline exceeded calling {self.endpoint}", request=request)
+                    self._clip_timeout(request, remaining)
+                    try:
+                        response = await transport.handle_async_request(request)
+                    except httpx.TransportError:
+                        if not self._should_retry(attempt):
+                            self.breaker.record_failure()
+                            raise
+                    else:
+                        if not self._should_retry(attempt, response):
+                            self._record(response)
+                            return self._wrap(response, meter)
+                        await response.aclose()
+                    attempt += 1
+                    self._retried(meter)
+                    await asyncio.sleep(self._backoff(attempt, expires - time.monotonic()))
+            except BaseException:
+                self._slots.release()
+                raise
+        except Exception as e:
+            if meter is not None:
+                meter.finish(e)
+            raise
+
+    def _slot_timeout(self, request):
+        # Waiting on our own concurrency limit says nothing about the endpoint, so the breaker is left alone
+        return httpx.PoolTimeout(f"Deadline exceeded waiting for a free slot to {self.endpoint}", request=request)
+
+    def _meter(self, request):
+        return CallMeter(self.endpoint, request) if request.url.path in METERED_PATHS else None
+
+    def _retried(self, meter):
+        self.retries += 1
+        if meter is not None:
+            meter.retries += 1
+
+    def _wrap(self, response, meter):
+        if meter is not None:
+            meter.status = response.status_code
+        stream = _ResponseStream(response.stream, meter, self._slots.release)
+        return httpx.Response(response.status_code, headers=response.headers, stream=stream,
+                              extensions=response.extensions)
+
+    def _record(self, response):
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def close(self):
+        self._sync.close()
+
+    async def aclose(self):
+        transport = self._async.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+async def aclose_transports():
+    """Close the running event loop's connections to every endpoint; call before closing the loop."""
+    with _transports_lock:
+        transports = list(_transports.values())
+    for transport in transports:
+        await transport.aclose()
+
+
+def get_transport(base_url):
+    """The process-wide transport (pool, limits, breaker) for an endpoint."""
+    endpoint = base_url.rstrip("/")
+    with _transports_lock:
+        transport = _transports.get(endpoint)
+        if transport is None:
+            transport = _transports[endpoint] = ResilientTransport(endpoint)
+        return transport
+
+
+def _client_kwargs(base_url):
+    # The transport enforces the overall deadline; these are per-attempt ceilings
+    return {
+        "transport": get_transport(base_url),
+        "timeout": httpx.Timeout(DEFAULT_DEADLINE, connect=CONNECT_TIMEOUT),
+    }
+
+
+class StreamingChatOllama(ChatOllama):
+    """ChatOllama that streams with tools bound too.
+
+    langchain-ollama 0.2.0 sends tool-calling requests with ``stream=False``,
+    so an agent's answer arrived as one token after the whole generation.
+    Ollama streams the content and sends tool calls in a single chunk, which
+    aggregates the same way (later langchain-ollama releases do this too).
+    """
+
+    def _chat_params(self, messages, stop, kwargs):
+        params = self._default_params
+        for key in self._default_params:
+            if key in kwargs:
+                params[key] = kwargs[key]
+        params["options"]["stop"] = stop if stop is not None else self.stop
+        return {
+            "model": params["model"],
+            "messages": self._convert_messages_to_ollama_messages(messages),
+            "stream": True,
+            "options": Options(**params["options"]),
+            "keep_alive": params["keep_alive"],
+            "format": params["format"],
+            **({"tools": kwargs["tools"]} if "tools" in kwargs else {}),
+        }
+
+    def _create_chat_stream(self, messages, stop=None, **kwargs):
+        yield from self._client.chat(**self._chat_params(messages, stop, kwargs))
+
+    async def _acreate_chat_stream(self, messages, stop=None, **kwargs):
+        async for part in await self._async_client.chat(**self._chat_params(messages, stop, kwargs)):
+            yield part
+
+
+def chat_model(model, base_url, **kwargs):
+    """LangChain chat model on the shared transport for ``base_url``."""
+    return StreamingChatOllama(model=model, base_url=base_url, client_kwargs=_client_kwargs(base_url), **kwargs)
+
+
+def completion_model(model, base_url, **kwargs):
+    """LangChain completion model on the shared transport for ``base_url``."""
+    return OllamaLLM(model=model, base_url=base_url, client_kwargs=_client_kwargs(base_url), **kwargs)
+
+
+class OllamaClient:
+    """Minimal Ollama REST client with sync and async methods over the shared transport."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.transport = get_transport(base_url)
+        self._client = httpx.Client(base_url=self.base_url, transport=self.transport,
+                                    timeout=httpx.Timeout(DEFAULT_DEADLINE, connect=CONNECT_TIMEOUT))
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = httpx.AsyncClient(
+                base_url=self.base_url, transport=self.transport,
+                timeout=httpx.Timeout(DEFAULT_DEADLINE, connect=CONNECT_TIMEOUT))
+        return client
+
+    @staticmethod
+    def _json(response):
+        response.raise_for_status()
+        return response.json()
+
+    def chat(self, model, messages, **options):
+        payload = {"model": model, "messages": messages, "stream": False, "options": options}
+        return self._json(self._client.post("/api/chat", json=payload))
+
+    def generate(self, model, prompt, **options):
+        payload = {"model": model, "prompt": prompt, "stream": False, "options": options}
+        return self._json(self._client.post("/api/generate", json=payload))
+
+    async def achat(self, model, messages, **options):
+        payload = {"model": model, "messages": messages, "stream": False, "options": options}
+        return self._json(await self._async_client().post("/api/chat", json=payload))
+
+    async def agenerate(self, model, prompt, **options):
+        payload = {"model": model, "prompt": prompt, "stream": False, "options": options}
+        return self._json(await self._async_client().post("/api/generate", json=payload))
@@ -0,0 +1,169 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+import pandas as pd
+import streamlit as st
+
+
+LOG_PATH = os.path.join(".cache", "llm_calls.jsonl")
+RECENT_CALLS = 200
+METERED_PATHS = ("/api/chat", "/api/generate", "/api/embed", "/api/embeddings")
+
+_scope = contextvars.ContextVar("llm_scope", default=("other", None))
+
+
+def set_llm_scope(page, session_id):
+    """Attribute the LLM calls made from the current script run (and its copied contexts) to a page and session."""
+    _scope.set((page, session_id))
+
+
+def current_scope():
+    return _scope.get()
+
+
+def session_id():
+    if "llm_session_id" not in st.session_state:
+        st.session_state.llm_session_id = os.urandom(8).hex()
+    return st.session_state.llm_session_id
+
+
+def _empty_totals():
+    return {"calls": 0, "errors": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0}
+
+
+class LLMMetrics:
+    """Process-wide accounting of LLM calls, aggregated per page and per session and logged as JSONL."""
+
+    def __init__(self, log_path=LOG_PATH):
+        self.log_path = log_path
+        self.recent = deque(maxlen=RECENT_CALLS)
+        self._pages = defaultdict(_empty_totals)
+        self._sessions = defaultdict(_empty_totals)
+        self._lock = threading.Lock()
+
+    def record(self, call):
+        with self._lock:
+            self.recent.append(call)
+            for totals in (self._pages[call["page"]], self._sessions[call["session"]]):
+                totals["calls"] += 1
+                totals["errors"] += call["error"] is not None
+                totals["retries"] += call["retries"]
+                totals["prompt_tokens"] += call["prompt_tokens"] or 0
+                totals["completion_tokens"] += call["completion_tokens"] or 0
+                totals["seconds"] += call["latency_s"]
+            if self.log_path:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps(call) + "\n")
+
+    def page_totals(self, page):
+        with self._lock:
+            return dict(self._pages.get(page) or _empty_totals())
+
+    def session_totals(self, session):
+        with self._lock:
+            return dict(self._sessions.get(session) or _empty_totals())
+
+    def calls(self, session=None, page=None):
+        with self._lock:
+            return [
+                call for call in self.recent
+                if (session is None or call["session"] == session) and (page is None or call["page"] == page)
+            ]
+
+
+_metrics = LLMMetrics()
+
+
+def get_llm_metrics():
+    return _metrics
+
+
+def usage_delta(before, after):
+    return {key: after[key] - before[key] for key in after}
+
+
+def format_usage(totals):
+    return (
+        f"LLM: {totals['calls']} calls, {totals['prompt_tokens']} prompt + "
+        f"{totals['completion_tokens']} completion tokens, {totals['seconds']:.1f}s"
+        + (f", {totals['retries']} retries" if totals["retries"] else "")
+        + (f", {totals['errors']} errors" if totals["errors"] else "")
+    )
+
+
+class CallMeter:
+    """Measures one HTTP call to an LLM endpoint while its response body is read.
+
+    Ollama reports token counts in the last JSON object of the body (the
+    final chunk when streaming), so only the tail of the body is kept.
+    """
+
+    def __init__(self, endpoint, request):
+        self.started = time.perf_counter()
+        self.endpoint = endpoint
+        self.path = request.url.path
+        try:
+            payload = json.loads(request.content or b"{}")
+        except (ValueError, UnicodeDecodeError):
+            payload = {}
+        self.model = payload.get("model")
+        self.streaming = payload.get("stream", True)
+        self.page, self.session = current_scope()
+        self.first_chunk = None
+        self.tail = b""
+        self.retries = 0
+        self.status = None
+        self._done = False
+
+    def chunk(self, data):
+        if self.first_chunk is None and data:
+            self.first_chunk = time.perf_counter()
+        self.tail = (self.tail + data)[-4096:]
+
+    def _count(self, key):
+        text = self.tail.decode("utf-8", "ignore")
+        matches = re.findall(rf'"{key}"\s*:\s*(\d+)', text)
+        return int(matches[-1]) if matches else None
+
+    def finish(self, error=None):
+        if self._done:
+            return
+        self._done = True
+        _metrics.record({
+            "ts": time.time(),
+            "page": self.page,
+            "session": self.session,
+            "endpoint": self.endpoint,
+            "path": self.path,
+            "model": self.model,
+            "status": self.status,
+            "prompt_tokens": self._count("prompt_eval_count"),
+            "completion_tokens": self._count("eval_count"),
+            "ttft_s": round(self.first_chunk - self.started, 4) if self.streaming and self.first_chunk else None,
+            "latency_s": round(time.perf_counter() - self.started, 4),
+            "retries": self.retries,
+            "error": None if error is None else f"{type(error).__name__}: {error}",
+        })
+
+
+def llm_usage_panel(page):
+    """Sidebar debug panel with this session's and this page's LLM usage."""
+    metrics = get_llm_metrics()
+    with st.sidebar.expander("LLM usage", expanded=True):
+        st.caption("This session")
+        st.write(format_usage(metrics.session_totals(session_id())))
+        st.caption(f"{page}, all sessions")
+        st.write(format_usage(metrics.page_totals(page)))
+        calls = metrics.calls(session=session_id())
+        if calls:
+            recent = pd.DataFrame(calls[-20:])[
+                ["page", "model", "path", "prompt_tokens", "completion_tokens", "ttft_s", "latency_s", "retries", "error"]
+            ]
+            st.dataframe(recent.iloc[::-1], hide_index=True)
+        st.caption(f"Every call is appended to {metrics.log_path}")
@@ -0,0 +1,362 @@
+import ast
+import atexit
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import streamlit as st
+from langchain_core.tools import BaseTool
+from langchain_experimental.tools.python.tool import PythonInputs, sanitize_input
+from pydantic import Field
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, only the hard timeout applies
+    resource = None
+
+
+DATASET_DIR = os.path.join(".cache", "datasets")
+POOL_SIZE = max(1, min(4, (os.cpu_count() or 2) - 1))
+CPU_SECONDS = 60
+MEMORY_MB = 2048
+TIMEOUT = 60.0
+MAX_OUTPUT_CHARS = 4000
+# Variables carried over to the next call of the conversation, in total; the rest are dropped
+MAX_CARRIED_BYTES = 16 * 1024 * 1024
+# Anything longer from a worker is refused (and the worker replaced)
+MAX_MESSAGE_BYTES = MAX_CARRIED_BYTES + 1024 * 1024
+
+
+def _load_frame(path):
+    if path.endswith(".arrow"):
+        # Memory-mapped: the OS shares the pages between workers and nothing is re-serialized per call
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+    return pd.read_pickle(path)
+
+
+def _plain(value):
+    """``value`` as JSON data; raises TypeError for anything that is not plain data."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return _plain(value.item())
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict) and all(isinstance(key, str) for key in value):
+        return {key: _plain(item) for key, item in value.items()}
+    raise TypeError(type(value).__name__)
+
+
+def _frame_bytes(value):
+    frame = value.to_frame() if isinstance(value, pd.Series) else value
+    table = pa.Table.from_pandas(frame)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _carried(namespace):
+    """The variables to send back to the conversation: JSON data and frames as Arrow IPC, nothing else.
+
+    The server never unpickles what a worker sends, so generated code
+    cannot smuggle objects (and their ``__reduce__``) out of the sandbox.
+    Returns ``(values, frames)`` with ``frames`` as ``(name, kind, bytes)``.
+    """
+    values, frames, size = {}, [], 0
+    for name, value in namespace.items():
+        if name.startswith("__") or name in ("df", "pd"):
+            continue
+        try:
+            if isinstance(value, (pd.DataFrame, pd.Series)):
+                kind = "series" if isinstance(value, pd.Series) else "frame"
+                blob = _frame_bytes(value)
+                if size + len(blob) <= MAX_CARRIED_BYTES:
+                    frames.append((name, kind, blob))
+                    size += len(blob)
+            else:
+                value = _plain(value)
+                encoded = len(json.dumps(value))
+                if size + encoded <= MAX_CARRIED_BYTES:
+                    values[name] = value
+                    size += encoded
+        except (TypeError, ValueError, pa.ArrowException):
+            continue
+    return values, frames
+
+
+def _restore(variables):
+    namespace = dict(variables.get("values", {}))
+    for name, (kind, blob) in variables.get("frames", {}).items():
+        frame = pa.ipc.open_stream(blob).read_all().to_pandas()
+        namespace[name] = frame.iloc[:, 0] if kind == "series" else frame
+    return namespace
+
+
+def _reply(conn, status, output, namespace=None):
+    """Send a result as a JSON header followed by one message per carried frame.
+
+    Without a ``namespace`` the conversation keeps the variables it had.
+    """
+    values, frames = _carried(namespace) if namespace is not None else ({}, [])
+    header = {
+        "status": status,
+        "output": output[:MAX_OUTPUT_CHARS + 1],
+        "carried": namespace is not None,
+        "values": values,
+        "frames": [[name, kind] for name, kind, _ in frames],
+    }
+    conn.send_bytes(json.dumps(header).encode())
+    for _, _, blob in frames:
+        conn.send_bytes(blob)
+
+
+def _receive(conn, timeout):
+    """Read a worker's reply without unpickling anything; None if it does not arrive in time."""
+    expires = time.monotonic() + timeout
+    if not conn.poll(timeout):
+        return None
+    header = json.loads(conn.recv_bytes(MAX_MESSAGE_BYTES))
+    frames = {}
+    for name, kind in header["frames"]:
+        if not conn.poll(max(expires - time.monotonic(), 0)):
+            return None
+        frames[str(name)] = (str(kind), conn.recv_bytes(MAX_MESSAGE_BYTES))
+    return header, frames
+
+
+def _execute(code, df, namespace):
+    """Run code like the agent's python_repl_ast tool: print the last expression, capture stdout.
+
+    ``df`` is a copy, so the worker's cached frame never changes; variables
+    land in ``namespace``.
+    """
+    tree = ast.parse(code)
+    namespace.update({"df": df.copy(), "pd": pd})
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        if tree.body and isinstance(tree.body[-1], ast.Expr):
+            exec(compile(ast.Module(tree.body[:-1], type_ignores=[]), "<agent>", "exec"), namespace)
+            result = eval(compile(ast.Expression(tree.body[-1].value), "<agent>", "eval"), namespace)
+            if result is not None:
+                print(result)
+        else:
+            exec(compile(tree, "<agent>", "exec"), namespace)
+    return stdout.getvalue()
+
+
+def _limit_cpu(cpu_seconds):
+    # RLIMIT_CPU counts the whole process lifetime, so move the limit forward for every job
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_seconds, resource.RLIM_INFINITY))
+
+
+def _worker_main(conn, cpu_seconds, memory_mb):
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 1024 * 1024, resource.RLIM_INFINITY))
+    # Makes the per-call df.copy() lazy: columns are only copied when the code writes to them
+    pd.set_option("mode.copy_on_write", True)
+    frames = {}
+    while True:
+        message = conn.recv()
+        if message is None:
+            return
+        dataset_key, path, code, variables = message
+        namespace = {}
+        try:
+            if dataset_key not in frames:
+                frames.clear()  # hold one dataset at a time
+                frames[dataset_key] = _load_frame(path)
+            if code is None:
+                _reply(conn, "ok", "")
+                continue
+            namespace = _restore(variables)
+            if resource is not None:
+                _limit_cpu(cpu_seconds)
+            output = _execute(code, frames[dataset_key], namespace)
+            _reply(conn, "ok", output, namespace)
+        except MemoryError:
+            frames.clear()
+            _reply(conn, "error", f"MemoryError: the code exceeded the {memory_mb} MB memory limit")
+        except Exception as e:
+            # Like the REPL, keep what was assigned before the error
+            _reply(conn, "error", f"{type(e).__name__}: {e}", namespace or None)
+
+
+class _Worker:
+    def __init__(self, context, cpu_seconds, memory_mb):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, cpu_seconds, memory_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class SandboxPool:
+    """Pre-started worker processes that run agent-generated pandas code.
+
+    Each dataset is written once as an uncompressed Arrow file that workers
+    memory-map and keep loaded. Jobs run under CPU-time and address-space
+    rlimits (where available) and a hard wall-clock timeout; a worker that
+    times out or dies is killed and replaced. At most ``size`` jobs run at
+    once, in parallel across cores.
+    """
+
+    def __init__(self, size=POOL_SIZE, cpu_seconds=CPU_SECONDS, memory_mb=MEMORY_MB, timeout=TIMEOUT):
+        self.timeout = timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._cpu_seconds = cpu_seconds
+        self._memory_mb = memory_mb
+        self._idle = queue.Queue()
+        self._workers = []
+        self._published = {}
+        self._lock = threading.Lock()
+        self._workers_lock = threading.Lock()
+        for _ in range(size):
+            self._idle.put(self._spawn())
+        atexit.register(self.close)
+
+    def _spawn(self):
+        worker = _Worker(self._context, self._cpu_seconds, self._memory_mb)
+        with self._workers_lock:
+            self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker):
+        worker.kill()
+        with self._workers_lock:
+            self._workers.remove(worker)
+        return self._spawn()
+
+    def publish(self, dataset_key, df):
+        """Write the dataset where workers can map it; a no-op when already published."""
+        with self._lock:
+            path = self._published.get(dataset_key)
+            if path is not None:
+                return path
+            os.makedirs(DATASET_DIR, exist_ok=True)
+            try:
+                path = os.path.join(DATASET_DIR, f"{dataset_key}.arrow")
+                table = pa.Table.from_pandas(df)
+                if not os.path.exists(path):
+                    feather.write_feather(table, f"{path}.tmp", compression="uncompressed")
+                    os.replace(f"{path}.tmp", path)
+            except (pa.ArrowException, ValueError):
+                # Mixed-type object columns cannot be expressed in Arrow
+                path = os.path.join(DATASET_DIR, f"{dataset_key}.pkl")
+                df.to_pickle(path)
+            self._published[dataset_key] = path
+            return path
+
+    def run(self, dataset_key, df, code, variables=None, timeout=None):
+        """Execute ``code`` against a fresh copy of the dataset in a worker.
+
+        ``variables`` are the conversation's variables from earlier calls, as
+        returned by the previous call (JSON data and Arrow-encoded frames).
+        Returns the captured output (or an error string) and the variables
+        after the call.
+        """
+        path = self.publish(dataset_key, df)
+        timeout = self.timeout if timeout is None else timeout
+        variables = variables or {}
+        worker = self._idle.get()
+        try:
+            worker.conn.send((dataset_key, path, code, variables))
+            reply = _receive(worker.conn, timeout)
+            if reply is None:
+                worker = self._replace(worker)
+                return f"Error: execution timed out after {timeout:.0f}s and was stopped.", variables
+            header, frames = reply
+            status, output = header["status"], str(header["output"])
+            if header["carried"]:
+                variables = {"values": header["values"], "frames": frames}
+        except (EOFError, OSError, ValueError, KeyError, TypeError):
+            # The process was killed, typically by the CPU-time limit (SIGXCPU), or sent something malformed
+            worker = self._replace(worker)
+            return "Error: the execution process died (CPU or memory limit exceeded).", variables
+        finally:
+            self._idle.put(worker)
+        output = output if status == "ok" else f"Error: {output}"
+        if len(output) > MAX_OUTPUT_CHARS:
+            output = output[:MAX_OUTPUT_CHARS] + "\n... (output truncated)"
+        return output, variables
+
+    def warm(self, dataset_key, df):
+        """Load the dataset into the idle workers in the background."""
+        path = self.publish(dataset_key, df)
+
+        def load():
+            workers = []
+            while True:
+                try:
+                    workers.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            for index, worker in enumerate(workers):
+                try:
+                    worker.conn.send((dataset_key, path, None, {}))
+                    if _receive(worker.conn, self.timeout) is None:
+                        workers[index] = self._replace(worker)
+                except (EOFError, OSError, ValueError, KeyError, TypeError):
+                    workers[index] = self._replace(worker)
+            for worker in workers:
+                self._idle.put(worker)
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def close(self):
+        for worker in list(self._workers):
+            with contextlib.suppress(OSError):
+                worker.conn.send(None)
+            worker.kill()
+        self._workers.clear()
+
+
+class SandboxedPythonTool(BaseTool):
+    """The pandas agent's python_repl_ast tool, run in the sandbox pool.
+
+    Variables carry over between calls like in the REPL as long as they are
+    plain data or frames, kept per tool instance, i.e. per conversation. ``df`` itself
+    starts from the original dataset on every call, which the description
+    tells the model.
+    """
+
+    name: str = "python_repl_ast"
+    description: str = (
+        "A Python shell. Use this to execute python commands. "
+        "Input should be a valid python command. "
+        "Variables holding numbers, strings, lists, dicts or dataframes are kept between calls, "
+        "but `df` is reset to the original dataframe on every call, so assign modified frames to a new name. "
+        "When using this tool, sometimes output is abbreviated - "
+        "make sure it does not look abbreviated before using it in your answer."
+    )
+    args_schema: Any = PythonInputs
+    pool: Any
+    dataset_key: str
+    df: Any
+    variables: dict = Field(default_factory=dict)
+
+    def _run(self, query, run_manager=None):
+        output, self.variables = self.pool.run(self.dataset_key, self.df, sanitize_input(query), self.variables)
+        return output
+
+
+@st.cache_resource
+def get_sandbox_pool():
+    return SandboxPool()
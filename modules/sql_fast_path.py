@@ -0,0 +1,86 @@
+import re
+import threading
+
+import duckdb
+import streamlit as st
+
+
+TABLE_NAME = "df"
+MAX_RESULT_ROWS = 1000
+QUERY_TIMEOUT = 30.0
+
+SQL_PROMPT = """You translate questions about a table into a single DuckDB SQL query.
+The table is named `{table}` and has these columns:
+{schema}
+
+{context}Question: {question}
+
+Reply with exactly one SELECT statement and nothing else. Quote column names with double quotes."""
+
+
+@st.cache_resource(max_entries=4)
+def get_connection(dataset_key, _df):
+    """In-memory DuckDB database holding a copy of the dataset as table `df`.
+
+    External access is switched off (and locked) after loading, so generated
+    queries can only read that table.
+    """
+    con = duckdb.connect()
+    con.register("source_frame", _df)
+    con.execute(f"CREATE TABLE {TABLE_NAME} AS SELECT * FROM source_frame")
+    con.unregister("source_frame")
+    con.execute("SET enable_external_access = false")
+    con.execute("SET lock_configuration = true")
+    return con
+
+
+def table_schema(con):
+    rows = con.cursor().execute(f"DESCRIBE {TABLE_NAME}").fetchall()
+    return "\n".join(f'- "{name}": {column_type}' for name, column_type, *_ in rows)
+
+
+def extract_sql(text):
+    """Pull the query out of a model reply, tolerating code fences and a trailing semicolon."""
+    fenced = re.search(r"```(?:sql)?\s*(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    sql = fenced.group(1) if fenced else text
+    return sql.strip().rstrip(";").strip()
+
+
+def validate_sql(con, sql):
+    statements = con.extract_statements(sql)
+    if len(statements) != 1:
+        raise ValueError(f"Expected one SQL statement, got {len(statements)}.")
+    if statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError(f"Only SELECT queries are allowed, got {statements[0].type.name}.")
+
+
+def run_sql(con, sql, limit=MAX_RESULT_ROWS, timeout=QUERY_TIMEOUT):
+    validate_sql(con, sql)
+    cursor = con.cursor()
+    timer = threading.Timer(timeout, cursor.interrupt)
+    timer.start()
+    try:
+        return cursor.execute(f"SELECT * FROM ({sql}) AS answer LIMIT {int(limit)}").df()
+    finally:
+        timer.cancel()
+        cursor.close()
+
+
+def answer_with_sql(llm, con, question, conversation_summary=""):
+    """One LLM call to write the query, then local execution. Returns (sql, result frame)."""
+    prompt = SQL_PROMPT.format(
+        table=TABLE_NAME,
+        schema=table_schema(con),
+        context=f"Conversation so far: {conversation_summary}\n\n" if conversation_summary else "",
+        question=question,
+    )
+    response = llm.invoke(prompt)
+    sql = extract_sql(getattr(response, "content", response))
+    return sql, run_sql(con, sql)
+
+
+def format_sql_answer(sql, result, max_rows=20):
+    """Markdown version of a SQL answer for the chat history."""
+    table = result.head(max_rows).to_markdown(index=False)
+    note = f"\n\n_Showing {max_rows} of {len(result)} rows._" if len(result) > max_rows else ""
+    return f"```sql\n{sql}\n```\n\n{table}{note}"
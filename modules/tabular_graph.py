@@ -0,0 +1,165 @@
+import re
+
+import pandas as pd
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+from langchain_core.documents import Document
+from pandas.api.types import is_bool_dtype, is_float_dtype, is_numeric_dtype
+
+
+MAX_CATEGORY_RATIO = 0.5
+MAX_TEXT_LENGTH = 60
+
+
+def node_label(column):
+    return "".join(part.capitalize() for part in re.split(r"[\W_]+", str(column)) if part) or "Entity"
+
+
+def property_name(column):
+    label = node_label(column)
+    return label[0].lower() + label[1:]
+
+
+def relation_type(column):
+    return "HAS_" + (re.sub(r"\W+", "_", str(column)).strip("_").upper() or "VALUE")
+
+
+def profile_columns(df):
+    """Cardinality profile used to tell identifiers, categories and measures apart."""
+    rows = max(len(df), 1)
+    profile = []
+    for column in df.columns:
+        series = df[column]
+        distinct = series.nunique(dropna=True)
+        text = series.dropna().astype(str) if series.dtype == object else None
+        profile.append({
+            "column": column,
+            "dtype": str(series.dtype),
+            "distinct": distinct,
+            "ratio": distinct / rows,
+            "nulls": int(series.isna().sum()),
+            "numeric": is_numeric_dtype(series) and not is_bool_dtype(series),
+            "boolean": is_bool_dtype(series),
+            "mean_length": text.str.len().mean() if text is not None and len(text) else 0.0,
+        })
+    return pd.DataFrame(profile)
+
+
+def infer_schema(df, max_category_ratio=MAX_CATEGORY_RATIO):
+    """Guess entities and relationships from the cardinality profile.
+
+    The anchor entity is a unique, non-float identifier column (preferring
+    text, then names containing "id" or "name"), else the highest-cardinality
+    category. Other text columns with repeated values (not flags) become
+    entities linked from the anchor; the remaining columns become anchor
+    properties. Returns ``{"entities", "relationships", "properties"}``
+    with relationships as ``(source column, type, target column)``.
+    """
+    profile = profile_columns(df).set_index("column")
+    if profile.empty:
+        return {"entities": [], "relationships": [], "properties": []}
+    rows = len(df)
+
+    def is_key(column):
+        info = profile.loc[column]
+        return rows and info["distinct"] == rows and not info["nulls"] and not is_float_dtype(df[column])
+
+    def is_category(column):
+        info = profile.loc[column]
+        return (not info["numeric"] and not info["boolean"] and 1 < info["distinct"] and info["ratio"] <= max_category_ratio
+                and info["mean_length"] <= MAX_TEXT_LENGTH)
+
+    keys = sorted(
+        (column for column in profile.index if is_key(column)),
+        key=lambda column: (profile.loc[column, "numeric"],
+                            not re.search(r"id|name", str(column), re.IGNORECASE)),
+    )
+    categories = [column for column in profile.index if is_category(column)]
+    if keys:
+        anchor = keys[0]
+    elif categories:
+        anchor = max(categories, key=lambda column: profile.loc[column, "distinct"])
+    else:
+        return {"entities": [], "relationships": [], "properties": []}
+
+    entities = [anchor] + [column for column in categories if column != anchor]
+    return {
+        "entities": entities,
+        "relationships": [(anchor, relation_type(column), column) for column in entities[1:]],
+        "properties": [column for column in profile.index if column not in entities],
+    }
+
+
+def frame_documents(df):
+    """Yield one Document per row, in CSVLoader's ``column: value`` format, straight from the frame.
+
+    Missing values become empty strings as they would after a CSV round
+    trip; the row position is kept in ``metadata["row"]``.
+    """
+    columns = [str(column) for column in df.columns]
+    for position, values in enumerate(df.itertuples(index=False, name=None)):
+        lines = (f"{column}: {'' if pd.isna(value) else value}" for column, value in zip(columns, values))
+        yield Document(page_content="\n".join(lines), metadata={"row": position})
+
+
+def _ids(series):
+    values = series.astype("string").str.strip()
+    return values.where(values.notna() & (values != ""))
+
+
+def build_graph_documents(df, schema, documents=None):
+    """Turn a table into one GraphDocument per row without an LLM.
+
+    Every distinct entity value becomes one Node (labelled after its column,
+    shared by all rows that contain it) and every distinct (source, type,
+    target) triple one Relationship; de-duplication and the property lookup
+    run as pandas operations. Columns in ``schema["properties"]`` are stored
+    on the first entity, taking each entity value's first row. ``documents``
+    are the row documents to use as sources (same order as ``df``; any
+    iterable, by default ``frame_documents(df)``).
+    """
+    entities = [column for column in schema["entities"] if column in df.columns]
+    if documents is None:
+        documents = frame_documents(df)
+    if not entities:
+        return [GraphDocument(nodes=[], relationships=[], source=document) for document in documents]
+
+    # Positional index: row i of ``ids`` belongs to documents[i]
+    ids = pd.DataFrame({column: _ids(df[column]).to_numpy() for column in entities})
+
+    nodes = {}
+    for column in entities:
+        label = node_label(column)
+        values = ids[column].dropna().drop_duplicates()
+        nodes[column] = {value: Node(id=value, type=label) for value in values}
+
+    anchor = entities[0]
+    properties = [column for column in schema.get("properties", []) if column in df.columns and column != anchor]
+    if properties:
+        firsts = df[properties].assign(_node=ids[anchor].to_numpy()).dropna(subset=["_node"]).groupby("_node").first()
+        for value, row in zip(firsts.index, firsts.to_dict("records")):
+            nodes[anchor][value].properties = {
+                property_name(key): item.item() if hasattr(item, "item") else item
+                for key, item in row.items() if pd.notna(item)
+            }
+
+    row_relationships = [[] for _ in range(len(df))]
+    for source, rel_type, target in schema["relationships"]:
+        if source not in ids or target not in ids:
+            continue
+        pairs = ids[[source, target]].dropna()
+        unique = pairs.drop_duplicates()
+        lookup = {
+            (s, t): Relationship(source=nodes[source][s], target=nodes[target][t], type=rel_type)
+            for s, t in zip(unique[source], unique[target])
+        }
+        for position, s, t in zip(pairs.index, pairs[source], pairs[target]):
+            row_relationships[position].append(lookup[(s, t)])
+
+    return [
+        GraphDocument(
+            nodes=[nodes[column][value] for column, value in zip(entities, values) if pd.notna(value)],
+            relationships=relationships,
+            source=document,
+        )
+        for document, values, relationships in zip(documents, ids.to_numpy(dtype=object), row_relationships)
+    ]
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.correlation import correlation_matrix
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    seconds = 1.7e9 + rng.uniform(0, 3e7, 20_000)
+    offset = rng.normal(0, 1, 20_000) + 1e8
+    return pd.DataFrame({
+        "epoch": seconds,
+        "trend": seconds * 1e-7 + rng.normal(0, 1, 20_000),
+        "offset": offset,
+        "noisy": (offset - 1e8) * 0.5 + rng.normal(0, 0.5, 20_000),
+    })
+
+
+def test_large_magnitude_columns_match_pandas(df):
+    np.testing.assert_allclose(correlation_matrix(df).to_numpy(), df.corr().to_numpy(), atol=1e-4)
+
+
+def test_pairwise_nulls_match_pandas(df):
+    df.iloc[::7, 0] = np.nan
+    df.iloc[::5, 3] = np.nan
+    np.testing.assert_allclose(correlation_matrix(df).to_numpy(), df.corr().to_numpy(), atol=1e-4)
+
+
+def test_constant_column_is_nan():
+    corr = correlation_matrix(pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": [5.0, 5.0, 5.0]}))
+    assert corr.loc["a", "a"] == 1.0
+    assert np.isnan(corr.loc["a", "b"]) and np.isnan(corr.loc["b", "b"])
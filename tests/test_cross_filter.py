@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+import streamlit as st
+
+from modules.cross_filter import CrossFilter
+from modules.filter_index import FilterIndex
+
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    # Selections live in session state, which outlives a test outside `streamlit run`
+    st.session_state.clear()
+
+
+def make_cross_filter(df):
+    return CrossFilter(FilterIndex(df), "test-dataset")
+
+
+def test_aggregate_sums_measure_per_category():
+    df = pd.DataFrame({"city": ["Rome", "Paris", "Rome", None], "sales": [1.0, 2.0, 3.0, 4.0]})
+    aggregated = make_cross_filter(df).aggregate("bar", "city", "sales")
+    assert list(aggregated.columns) == ["city", "sales_sum"]
+    assert dict(zip(aggregated["city"], aggregated["sales_sum"])) == {"Rome": 4.0, "Paris": 2.0}
+
+
+def test_aggregate_counts_rows_without_measure():
+    df = pd.DataFrame({"city": ["Rome", "Paris", "Rome"]})
+    aggregated = make_cross_filter(df).aggregate("pie", "city")
+    assert dict(zip(aggregated["city"], aggregated["count"])) == {"Rome": 2, "Paris": 1}
+
+
+def test_aggregate_same_dimension_and_measure():
+    df = pd.DataFrame({"quantity": [1, 2, 2, 5]})
+    aggregated = make_cross_filter(df).aggregate("bar", "quantity", "quantity")
+    value = CrossFilter.value_name("quantity", "quantity")
+    assert list(aggregated.columns) == ["quantity", value]
+    assert dict(zip(aggregated["quantity"], aggregated[value])) == {1: 1.0, 2: 4.0, 5: 5.0}
+
+
+def test_value_name_never_equals_dimension():
+    assert CrossFilter.value_name("count") != "count"
+    assert CrossFilter.value_name("sales_sum", "sales") != "sales_sum"
+
+
+def test_aggregate_applies_other_charts_selections_only():
+    df = pd.DataFrame({"city": ["Rome", "Paris", "Rome", "Oslo"], "sales": [1.0, 2.0, 3.0, 4.0]})
+    cross_filter = make_cross_filter(df)
+    cross_filter.selections["scatter"] = (None, "rows", (0, 1))
+    filtered = cross_filter.aggregate("bar", "city", "sales")
+    assert dict(zip(filtered["city"], filtered["sales_sum"])) == {"Rome": 1.0, "Paris": 2.0}
+    # A chart's own selection does not filter it
+    unfiltered = cross_filter.aggregate("scatter", "city", "sales")
+    assert np.isclose(unfiltered["sales_sum"].sum(), 10.0)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from modules.figure_cache import FigureCache, figure_nbytes
+
+
+def scatter(rows):
+    return px.scatter(pd.DataFrame({"x": np.arange(rows, dtype=float), "y": np.ones(rows)}), x="x", y="y")
+
+
+def test_hit_returns_the_built_figure():
+    cache = FigureCache()
+    builds = []
+    build = lambda: builds.append(1) or scatter(10)
+    first = cache.get_or_build("a", build)
+    assert cache.get_or_build("a", build) is first
+    assert len(builds) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_figure_nbytes_counts_the_data_arrays():
+    assert figure_nbytes(scatter(100_000)) >= 2 * 100_000 * 8
+
+
+def test_evicts_least_recently_used_past_the_byte_bound():
+    size = figure_nbytes(scatter(10_000))
+    cache = FigureCache(maxbytes=int(size * 2.5))
+    cache.get_or_build("a", lambda: scatter(10_000))
+    cache.get_or_build("b", lambda: scatter(10_000))
+    cache.get_or_build("a", lambda: scatter(10_000))
+    cache.get_or_build("c", lambda: scatter(10_000))
+    assert cache.stats()["size"] == 2
+    assert cache.stats()["bytes"] <= cache.maxbytes
+    assert set(cache._figures) == {"a", "c"}
+
+
+def test_evicts_past_the_entry_bound():
+    cache = FigureCache(maxsize=2)
+    for key in "abc":
+        cache.get_or_build(key, lambda: scatter(10))
+    assert list(cache._figures) == ["b", "c"]
+
+
+def test_oversized_figure_is_not_cached():
+    cache = FigureCache(maxbytes=1000)
+    fig = cache.get_or_build("big", lambda: scatter(10_000))
+    assert fig.data
+    assert cache.stats()["size"] == 0 and cache.stats()["bytes"] == 0
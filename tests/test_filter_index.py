@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.filter_index import FilterIndex
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "city": ["Rome", "Paris", None, "Rome", "Oslo", "Paris"],
+        "age": [30, 45, 22, np.nan, 61, 45],
+        "flag": [True, False, True, False, True, True],
+    })
+
+
+def test_in_filter_matches_isin(df):
+    index = FilterIndex(df)
+    mask = index.mask((("city", "in", ("Rome", "Oslo")),))
+    assert mask.tolist() == df["city"].isin(["Rome", "Oslo"]).tolist()
+
+
+def test_in_filter_ignores_unknown_values(df):
+    index = FilterIndex(df)
+    assert not index.mask((("city", "in", ("Berlin",)),)).any()
+
+
+def test_range_filter_is_inclusive_and_skips_nulls(df):
+    index = FilterIndex(df)
+    mask = index.mask((("age", "range", (30, 45)),))
+    assert mask.tolist() == df["age"].between(30, 45).tolist()
+
+
+def test_rows_filter(df):
+    index = FilterIndex(df)
+    assert np.flatnonzero(index.mask(((None, "rows", (1, 4)),))).tolist() == [1, 4]
+
+
+def test_stacked_filters_are_anded(df):
+    index = FilterIndex(df)
+    filters = (("city", "in", ("Paris",)), ("age", "range", (40, 50)), (None, "rows", (0, 1, 2)))
+    assert np.flatnonzero(index.mask(filters)).tolist() == [1]
+    assert index.filter(filters).index.tolist() == [1]
+
+
+def test_no_filters_keeps_every_row(df):
+    assert FilterIndex(df).mask(()).all()
+
+
+def test_unknown_kind_raises(df):
+    with pytest.raises(ValueError):
+        FilterIndex(df).mask((("city", "like", "R%"),))
+
+
+def test_codes_and_value_range(df):
+    index = FilterIndex(df)
+    uniques, codes = index.codes("city")
+    assert [uniques[code] if code >= 0 else None for code in codes] == df["city"].tolist()
+    assert index.value_range("age") == (22.0, 61.0)
+    assert not index.is_numeric("flag")
+    assert index.is_numeric("age")
+
+
+def test_value_range_of_integer_column_is_int():
+    index = FilterIndex(pd.DataFrame({"n": [3, 1, 2]}))
+    assert index.value_range("n") == (1, 3)
+    assert isinstance(index.value_range("n")[0], int)
+
+
+def test_bitmaps_are_cached_and_not_mutated_by_mask(df):
+    index = FilterIndex(df)
+    paris = ("city", "in", ("Paris",))
+    before = index.bitmap(*paris).copy()
+    index.mask((paris, ("age", "range", (0, 40))))
+    assert index.bitmap(*paris) is index.bitmap(*paris)
+    assert np.array_equal(index.bitmap(*paris), before)
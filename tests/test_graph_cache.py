@@ -0,0 +1,60 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_experimental.graph_transformers import LLMGraphTransformer
+
+from modules import graph_cache
+from modules.graph_cache import document_key, extraction_signature
+from modules.llm_client import completion_model
+
+
+def transformer(**kwargs):
+    # Nothing is sent to the endpoint; the transformer is only inspected
+    return LLMGraphTransformer(llm=completion_model("llama3", "http://127.0.0.1:9"), **kwargs)
+
+
+def test_signature_is_stable():
+    assert extraction_signature(transformer(), "llama3") == extraction_signature(transformer(), "llama3")
+
+
+def test_signature_ignores_allowed_node_order():
+    first = transformer(allowed_nodes=["Person", "City"])
+    second = transformer(allowed_nodes=["City", "Person"])
+    assert extraction_signature(first, "llama3") == extraction_signature(second, "llama3")
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"allowed_nodes": ["Person"]},
+    {"allowed_nodes": ["Person"], "allowed_relationships": ["LIVES_IN"]},
+    {"strict_mode": False},
+])
+def test_signature_changes_with_settings(kwargs):
+    assert extraction_signature(transformer(**kwargs), "llama3") != extraction_signature(transformer(), "llama3")
+
+
+def test_signature_changes_with_model():
+    assert extraction_signature(transformer(), "llama3") != extraction_signature(transformer(), "mistral")
+
+
+def test_signature_changes_with_extraction_version(monkeypatch):
+    before = extraction_signature(transformer(), "llama3")
+    monkeypatch.setattr(graph_cache, "EXTRACTION_VERSION", graph_cache.EXTRACTION_VERSION + 1)
+    assert extraction_signature(transformer(), "llama3") != before
+
+
+def test_document_key_depends_on_text_and_signature():
+    document = Document(page_content="name: Ada\ncity: London", metadata={"row": 1})
+    same_text = Document(page_content="name: Ada\ncity: London", metadata={"row": 7})
+    assert document_key(document, "a") == document_key(same_text, "a")
+    assert document_key(document, "a") != document_key(document, "b")
+    assert document_key(document, "a") != document_key(Document(page_content="name: Bob"), "a")
+
+
+def test_signature_ignores_pack_settings_for_single_rows():
+    assert extraction_signature(transformer(), "llama3", 1, 500) == extraction_signature(transformer(), "llama3")
+
+
+@pytest.mark.parametrize("pack", [(4, 1500), (8, 1500), (4, 3000)])
+def test_signature_changes_with_pack_settings(pack):
+    packed = extraction_signature(transformer(), "llama3", *pack)
+    assert packed != extraction_signature(transformer(), "llama3")
+    assert packed != extraction_signature(transformer(), "llama3", 2, 1000)
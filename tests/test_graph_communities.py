@@ -0,0 +1,79 @@
+import itertools
+
+import numpy as np
+
+from modules.graph_communities import communities, csr_adjacency, label_propagation, level_of_detail
+
+
+def edges(pairs):
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def two_cliques(size=6):
+    """Two cliques of ``size`` nodes joined by a single edge."""
+    pairs = list(itertools.combinations(range(size), 2))
+    pairs += [(a + size, b + size) for a, b in pairs]
+    pairs.append((0, size))
+    return edges(pairs)
+
+
+def test_csr_adjacency_is_undirected_without_self_loops():
+    sources, targets = edges([(0, 1), (1, 2), (2, 2), (3, 0)])
+    indptr, indices = csr_adjacency(sources, targets, 5)
+    neighbours = [sorted(indices[indptr[i]:indptr[i + 1]].tolist()) for i in range(5)]
+    assert neighbours == [[1, 3], [0, 2], [1], [0], []]
+
+
+def test_csr_adjacency_edge_positions():
+    sources, targets = edges([(0, 1), (1, 2), (2, 2), (3, 0)])
+    indptr, indices, positions = csr_adjacency(sources, targets, 4, return_edges=True)
+    rows = np.repeat(np.arange(4), np.diff(indptr))
+    for row, col, position in zip(rows, indices, positions):
+        assert {row, col} == {sources[position], targets[position]}
+    assert 2 not in positions
+
+
+def test_label_propagation_separates_cliques():
+    sources, targets = two_cliques()
+    labels = label_propagation(*csr_adjacency(sources, targets, 12))
+    assert len(set(labels[:6])) == 1
+    assert len(set(labels[6:])) == 1
+    assert labels[0] != labels[6]
+
+
+def test_label_propagation_is_deterministic_per_seed():
+    sources, targets = two_cliques()
+    indptr, indices = csr_adjacency(sources, targets, 12)
+    assert np.array_equal(label_propagation(indptr, indices, seed=3), label_propagation(indptr, indices, seed=3))
+
+
+def test_isolated_nodes_keep_their_own_label():
+    sources, targets = edges([(0, 1)])
+    labels = label_propagation(*csr_adjacency(sources, targets, 4))
+    assert labels[0] == labels[1]
+    assert labels[2] == 2 and labels[3] == 3
+    assert label_propagation(*csr_adjacency(*edges([]), 3)).tolist() == [0, 1, 2]
+
+
+def test_communities_are_numbered_by_size():
+    sources, targets = two_cliques()
+    # A third, smaller group
+    sources = np.append(sources, [12, 13])
+    targets = np.append(targets, [13, 14])
+    community, degree = communities(sources, targets, 15)
+    assert community[12] == community[13] == community[14] == 2
+    assert degree.tolist()[:2] == [6, 5]
+
+
+def test_level_of_detail_merges_reverse_edges():
+    assignment = {
+        "node_ids": ["a", "b", "c", "d"],
+        "community": np.array([0, 0, 1, 1]),
+        "degree": np.array([1, 1, 1, 1]),
+        "sources": np.array([0, 2, 1]),
+        "targets": np.array([2, 0, 3]),
+    }
+    detail = level_of_detail(assignment)
+    assert detail["edges"] == [("community:0", "community:1", 3)]
+    assert detail["communities"] == {"community:0": (2, 0), "community:1": (2, 2)}
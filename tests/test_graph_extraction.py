@@ -0,0 +1,63 @@
+import threading
+
+from langchain_community.graphs.graph_document import GraphDocument, Node
+from langchain_core.documents import Document
+
+from modules.graph_cache import GraphDocumentCache
+from modules.graph_extraction import extract_with_cache
+
+
+class RecordingTransformer:
+    """Extracts one node per row and records how many rows had been read at its first call."""
+
+    def __init__(self, reads):
+        self.reads = reads
+        self.read_at_first_call = None
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def process_response(self, document):
+        with self._lock:
+            self.calls += 1
+            if self.read_at_first_call is None:
+                self.read_at_first_call = self.reads[0]
+        return GraphDocument(nodes=[Node(id=document.page_content, type="Row")], relationships=[], source=document)
+
+
+def rows(count, reads):
+    for index in range(count):
+        reads[0] += 1
+        yield Document(page_content=f"name: row {index}", metadata={"row": index})
+
+
+def run(cache, count, **kwargs):
+    reads = [0]
+    transformer = RecordingTransformer(reads)
+    results = list(extract_with_cache(transformer, rows(count, reads), cache, "sig", total=count, **kwargs))
+    return transformer, results
+
+
+def test_first_call_does_not_wait_for_the_whole_dataset(tmp_path):
+    transformer, results = run(GraphDocumentCache(tmp_path / "cache.db"), 2000, workers=2, batch_size=10)
+    assert transformer.read_at_first_call <= 100
+    assert sum(len(batch) for batch, _ in results) == 2000
+    assert results[-1][1]["done"] == 2000
+
+
+def test_cached_rows_are_served_without_calls(tmp_path):
+    cache = GraphDocumentCache(tmp_path / "cache.db")
+    run(cache, 60, workers=2, batch_size=10)
+    transformer, results = run(cache, 100, workers=2, batch_size=10)
+    assert transformer.calls == 40
+    documents = [document for batch, _ in results for document in batch]
+    assert sorted(document.source.metadata["row"] for document in documents) == list(range(100))
+    assert results[-1][1]["cached"] == 60 and results[-1][1]["done"] == 100
+
+
+def test_fully_cached_run_makes_no_calls(tmp_path):
+    cache = GraphDocumentCache(tmp_path / "cache.db")
+    run(cache, 30, batch_size=10)
+    transformer, results = run(cache, 30, batch_size=10)
+    assert transformer.calls == 0
+    assert [len(batch) for batch, _ in results] == [10, 10, 10]
+    assert results[-1][1]["cached"] == 30
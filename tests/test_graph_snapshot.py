@@ -0,0 +1,61 @@
+import numpy as np
+
+from modules.graph_snapshot import GraphSnapshot
+
+
+def snapshot(keys, pairs):
+    nodes = [{"id": f"n{i}", "label": key, "group": "Entity", "title": key, "key": key} for i, key in enumerate(keys)]
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    return GraphSnapshot("test", nodes, pairs[:, 0], pairs[:, 1],
+                         np.array([f"r{i}" for i in range(len(pairs))], dtype=object),
+                         np.array(["LINKS"] * len(pairs), dtype=object))
+
+
+# alpha - beta - gamma - delta, plus a shortcut alpha - epsilon - delta and an unconnected zeta
+KEYS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta"]
+PAIRS = [(0, 1), (1, 2), (2, 3), (0, 4), (3, 4)]
+
+
+def test_path_finds_a_shortest_path():
+    view = snapshot(KEYS, PAIRS).path("alpha", "delta")
+    assert set(view["nodes"]) == {"n0", "n4", "n3"}
+    assert set(view["edges"]) == {"r3", "r4"}
+
+
+def test_path_ignores_direction():
+    # Every relationship points away from delta
+    view = snapshot(KEYS, [(1, 0), (2, 1), (3, 2)]).path("alpha", "delta")
+    assert set(view["nodes"]) == {"n0", "n1", "n2", "n3"}
+    assert set(view["edges"]) == {"r0", "r1", "r2"}
+
+
+def test_path_only_returns_relationships_along_the_path():
+    # beta - gamma links two path nodes but is not on the path
+    view = snapshot(["alpha", "beta", "gamma"], [(0, 1), (1, 2), (0, 2)]).path("alpha", "gamma")
+    assert set(view["nodes"]) == {"n0", "n2"}
+    assert set(view["edges"]) == {"r2"}
+
+
+def test_path_respects_max_hops():
+    graph = snapshot(KEYS, [(0, 1), (1, 2), (2, 3)])
+    assert graph.path("alpha", "delta", max_hops=2) == {"nodes": {}, "edges": {}}
+    assert len(graph.path("alpha", "delta", max_hops=3)["nodes"]) == 4
+
+
+def test_path_without_a_connection_or_a_match_is_empty():
+    graph = snapshot(KEYS, PAIRS)
+    assert graph.path("alpha", "zeta") == {"nodes": {}, "edges": {}}
+    assert graph.path("alpha", "omega") == {"nodes": {}, "edges": {}}
+    assert graph.path("omega", "alpha") == {"nodes": {}, "edges": {}}
+
+
+def test_path_search_is_case_insensitive_and_prefers_short_keys():
+    graph = snapshot(["Alpha Centauri", "Alpha", "beta"], [(0, 2), (1, 2)])
+    view = graph.path("ALPHA", "Beta")
+    assert set(view["nodes"]) == {"n1", "n2"}
+
+
+def test_path_never_ends_where_it_starts():
+    graph = snapshot(["alpha", "alpha two", "beta"], [(0, 2), (2, 1)])
+    view = graph.path("alpha", "alpha")
+    assert set(view["nodes"]) == {"n0", "n2", "n1"}
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.tools import tool
+
+from modules.fake_ollama import FakeOllama
+from modules.llm_client import ResilientTransport, chat_model, deadline
+
+
+@tool
+def python_repl_ast(query: str) -> str:
+    """Run a Python expression."""
+    return "(30, 5)"
+
+
+@pytest.fixture(scope="module")
+def fake():
+    with FakeOllama() as server:
+        yield server
+
+
+def test_tool_bound_model_streams_the_answer(fake):
+    llm = chat_model("qwen", fake.url).bind_tools([python_repl_ast])
+    messages = [
+        HumanMessage("How many rows?"),
+        {"role": "assistant", "content": "", "tool_calls": [{"name": "python_repl_ast", "args": {"query": "df.shape"}, "id": "1"}]},
+        ToolMessage("(30, 5)", tool_call_id="1"),
+    ]
+    chunks = [chunk.content for chunk in llm.stream(messages)]
+    assert len([c for c in chunks if c]) > 1
+    assert "".join(chunks) == "Based on the data, the result is (30, 5)."
+
+
+def test_tool_call_survives_streaming(fake):
+    llm = chat_model("qwen", fake.url).bind_tools([python_repl_ast])
+    message = llm.invoke([HumanMessage("How many rows?")])
+    assert [call["name"] for call in message.tool_calls] == ["python_repl_ast"]
+    assert message.tool_calls[0]["args"] == {"query": fake.tool_query}
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_slot_wait_is_bounded_by_the_deadline(fake, use_async):
+    transport = ResilientTransport(fake.url, max_connections=1)
+    request = httpx.Request("GET", fake.url + "api/tags")
+    transport._slots.acquire()  # a call already in flight holds the only slot
+    started = time.monotonic()
+    with deadline(0.2), pytest.raises(httpx.TimeoutException):
+        if use_async:
+            asyncio.run(transport.handle_async_request(request))
+        else:
+            transport.handle_request(request)
+    assert time.monotonic() - started < 1.0
+    assert transport.breaker.state == "closed" and transport.breaker.failures == 0
+    transport._slots.release()
+    transport.close()
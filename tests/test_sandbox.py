@@ -0,0 +1,52 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from modules import sandbox
+from modules.sandbox import _carried, _restore
+
+
+class Smuggled:
+    def __reduce__(self):
+        return os.getpid, ()
+
+
+def carried(namespace):
+    values, frames = _carried(namespace)
+    return values, {name: (kind, blob) for name, kind, blob in frames}
+
+
+def test_only_plain_data_and_frames_are_carried():
+    values, frames = carried({
+        "count": np.int64(3),
+        "ratio": 0.5,
+        "names": ("a", ["b", None]),
+        "stats": {"mean": 1.0},
+        "smuggled": Smuggled(),
+        "nested": [Smuggled()],
+        "by_key": {1: "one"},
+        "fn": len,
+        "df": pd.DataFrame({"a": [1]}),
+        "pd": pd,
+    })
+    assert values == {"count": 3, "ratio": 0.5, "names": ["a", ["b", None]], "stats": {"mean": 1.0}}
+    assert frames == {}
+    json.dumps(values)
+
+
+def test_frames_round_trip_through_arrow():
+    top = pd.DataFrame({"city": ["Rome", "Paris"], "sales": [1.5, 2.5]}, index=[3, 7])
+    totals = pd.Series([1, 2], name="total")
+    values, frames = carried({"top": top, "totals": totals})
+    assert all(isinstance(blob, bytes) for _, blob in frames.values())
+    namespace = _restore({"values": values, "frames": frames})
+    pd.testing.assert_frame_equal(namespace["top"], top)
+    pd.testing.assert_series_equal(namespace["totals"], totals)
+
+
+def test_carried_size_is_bounded(monkeypatch):
+    monkeypatch.setattr(sandbox, "MAX_CARRIED_BYTES", 100)
+    values, _ = carried({"small": "x" * 10, "large": "x" * 200})
+    assert list(values) == ["small"]
@@ -0,0 +1,56 @@
+import duckdb
+import pandas as pd
+import pytest
+
+from modules.sql_fast_path import extract_sql, get_connection, run_sql, validate_sql
+
+
+@pytest.fixture(scope="module")
+def con():
+    df = pd.DataFrame({"city": ["Rome", "Paris", "Rome"], "sales": [1.0, 2.0, 3.0]})
+    return get_connection("test-sql-fast-path", df)
+
+
+def test_validate_accepts_one_select(con):
+    validate_sql(con, 'SELECT "city", sum("sales") FROM df GROUP BY 1')
+
+
+@pytest.mark.parametrize("sql", ["DROP TABLE df", "INSERT INTO df VALUES ('Oslo', 4.0)", "CREATE TABLE t AS SELECT 1"])
+def test_validate_rejects_other_statements(con, sql):
+    with pytest.raises(ValueError, match="Only SELECT"):
+        validate_sql(con, sql)
+
+
+def test_validate_rejects_several_statements(con):
+    with pytest.raises(ValueError, match="one SQL statement"):
+        validate_sql(con, "SELECT 1; DROP TABLE df")
+
+
+def test_run_sql_returns_a_frame(con):
+    result = run_sql(con, 'SELECT "city", sum("sales") AS total FROM df GROUP BY "city" ORDER BY "city"')
+    assert result.to_dict("records") == [{"city": "Paris", "total": 2.0}, {"city": "Rome", "total": 4.0}]
+
+
+def test_run_sql_applies_the_row_limit(con):
+    assert len(run_sql(con, "SELECT * FROM range(5000)", limit=10)) == 10
+
+
+def test_run_sql_rejects_writes_before_running(con):
+    with pytest.raises(ValueError):
+        run_sql(con, "DELETE FROM df")
+    assert len(run_sql(con, "SELECT * FROM df")) == 3
+
+
+def test_external_access_is_disabled(con):
+    with pytest.raises(duckdb.Error):
+        run_sql(con, "SELECT * FROM read_csv('/etc/passwd')")
+
+
+def test_run_sql_times_out(con):
+    with pytest.raises(duckdb.Error):
+        run_sql(con, "SELECT count(*) FROM range(100000000000) a", timeout=0.2)
+
+
+def test_extract_sql_strips_fences_and_semicolon():
+    assert extract_sql("Here you go:\n```sql\nSELECT 1;\n```") == "SELECT 1"
+    assert extract_sql("SELECT 2;") == "SELECT 2"